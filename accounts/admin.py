@@ -1,5 +1,5 @@
 from django.contrib import admin
-from .models import Profile, Notification, Conversation, Message, UserNote, MessageRequest, Post, Comment, Story, StoryView, SavedPost
+from .models import Profile, Notification, Conversation, ConversationReadState, Message, UserNote, MessageRequest, Post, Comment, Story, StoryView, SavedPost
 
 
 @admin.register(Profile)
@@ -22,10 +22,16 @@ class ConversationAdmin(admin.ModelAdmin):
     filter_horizontal = ('participants',)
 
 
+@admin.register(ConversationReadState)
+class ConversationReadStateAdmin(admin.ModelAdmin):
+    list_display = ('conversation', 'user', 'last_read_message_id', 'unread_count', 'updated_at')
+    search_fields = ('user__username',)
+
+
 @admin.register(Message)
 class MessageAdmin(admin.ModelAdmin):
-    list_display = ('sender', 'conversation', 'text', 'is_read', 'created_at')
-    list_filter = ('is_read', 'created_at')
+    list_display = ('sender', 'conversation', 'text', 'created_at')
+    list_filter = ('created_at',)
     search_fields = ('sender__username', 'text')
 
 
@@ -7,6 +7,17 @@ class AccountsConfig(AppConfig):
 
     def ready(self):
         """Auto-setup OAuth when Django starts"""
+        from django.db.backends.signals import connection_created
+        from django.db.models.signals import post_migrate
+        from .db import apply_sqlite_pragmas
+        from .search import install_search_index
+        
+        # WAL and friends on every new SQLite connection
+        connection_created.connect(apply_sqlite_pragmas)
+        
+        # Full-text index objects live outside the migration graph
+        post_migrate.connect(install_search_index, sender=self)
+        
         try:
             self.setup_oauth_if_needed()
         except Exception:
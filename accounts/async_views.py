@@ -0,0 +1,218 @@
+"""
+Native async versions of the hottest read endpoints, served under
+``/api/async/``.
+
+Under Daphne a sync DRF view occupies a worker thread for the whole
+request. These views are plain Django async views: the request itself
+never holds a thread, and each query is awaited through the async ORM.
+(In Django 4.2 every async query still runs in the sync thread for the
+duration of that query only.) Everything a serializer would otherwise
+load lazily is fetched up front in batched queries, and the
+``Preloaded*`` serializers then render without touching the database.
+
+Responses match the sync endpoints. Authentication is JWT only, through
+the same per-process user cache as ``CachedJWTAuthentication``.
+"""
+from functools import wraps
+
+from asgiref.sync import sync_to_async
+from django.contrib.auth.models import AnonymousUser, User
+from django.core.files.storage import default_storage
+from django.db.models import Count, Exists, OuterRef
+from django.http import JsonResponse
+from rest_framework.exceptions import AuthenticationFailed
+from rest_framework.request import Request
+from rest_framework.utils.encoders import JSONEncoder
+from rest_framework.utils.urls import remove_query_param, replace_query_param
+from rest_framework_simplejwt.exceptions import TokenError
+from rest_framework_simplejwt.settings import api_settings
+
+from .authentication import CachedJWTAuthentication
+from .cache import get_user, set_user
+from .models import Comment, Notification, Post, Profile, SavedPost
+from .pagination import InboxCursorPagination
+from .serializers import (
+    InboxConversationSerializer, PreloadedNotificationSerializer, PreloadedPostSerializer
+)
+from .views import INBOX_PRIMARY, inbox_queryset
+
+
+FEED_PAGE_SIZE = 10
+EXPLORE_SIZE = 20
+NOTIFICATIONS_PAGE_SIZE = 10
+
+
+def json_response(data, status=200):
+    return JsonResponse(data, status=status, encoder=JSONEncoder, safe=False)
+
+
+async def authenticate(request):
+    """User for the request's Bearer token, or None"""
+    auth = CachedJWTAuthentication()
+    try:
+        header = auth.get_header(request)
+        raw_token = auth.get_raw_token(header) if header else None
+        if raw_token is None:
+            return None
+        token = auth.get_validated_token(raw_token)
+        user_id = token[api_settings.USER_ID_CLAIM]
+    except (AuthenticationFailed, TokenError, KeyError):
+        return None
+
+    user = get_user(user_id)
+    if user is None:
+        user = await User.objects.select_related('profile').filter(pk=user_id).afirst()
+        if user is None:
+            return None
+        set_user(user)
+    try:
+        auth.check_user(user, token)
+    except AuthenticationFailed:
+        return None
+    return user
+
+
+def async_api(login_required=True):
+    """GET-only async view with request.user set from the JWT"""
+    def decorator(view):
+        @wraps(view)
+        async def wrapper(request, *args, **kwargs):
+            if request.method != 'GET':
+                return json_response({'detail': f'Method "{request.method}" not allowed.'}, status=405)
+            user = await authenticate(request)
+            if user is None and login_required:
+                return json_response({'detail': 'Authentication credentials were not provided.'}, status=401)
+            request.user = user or AnonymousUser()
+            return await view(request, *args, **kwargs)
+        return wrapper
+    return decorator
+
+
+def page_number(request):
+    try:
+        return max(1, int(request.GET.get('page', 1)))
+    except ValueError:
+        return 1
+
+
+async def following_user_ids(user):
+    Following = Profile.following.through
+    return {
+        user_id async for user_id in Following.objects.filter(
+            from_profile__user_id=user.pk
+        ).values_list('to_profile__user_id', flat=True)
+    }
+
+
+def post_queryset(user):
+    """Posts with author, profile, comment count and viewer state in one query"""
+    posts = Post.objects.select_related('author', 'author__profile').annotate(
+        comments_total=Count('comments')
+    )
+    if user.is_authenticated:
+        posts = posts.annotate(
+            viewer_has_liked=Exists(
+                Post.likes.through.objects.filter(post_id=OuterRef('pk'), user_id=user.pk)
+            ),
+            viewer_has_saved=Exists(
+                SavedPost.objects.filter(post_id=OuterRef('pk'), user_id=user.pk)
+            ),
+        )
+    return posts
+
+
+async def render_posts(request, posts, following):
+    """Serialize posts after loading all their comments in one query"""
+    comments_by_post = {}
+    comments = Comment.objects.filter(
+        post_id__in=[post.id for post in posts]
+    ).select_related('author', 'author__profile')
+    async for comment in comments.aiterator():
+        comments_by_post.setdefault(comment.post_id, []).append(comment)
+
+    context = {
+        'request': request,
+        'comments_by_post': comments_by_post,
+        '_following_user_ids': following,
+    }
+    return PreloadedPostSerializer(posts, many=True, context=context).data
+
+
+@async_api()
+async def feed_view(request):
+    """Async feed_view"""
+    user = request.user
+    following = await following_user_ids(user)
+    posts = post_queryset(user).filter(author_id__in=following).order_by('-created_at')
+
+    page = page_number(request)
+    start = (page - 1) * FEED_PAGE_SIZE
+    page_posts = [post async for post in posts[start:start + FEED_PAGE_SIZE].aiterator()]
+
+    return json_response({
+        'results': await render_posts(request, page_posts, following),
+        'count': await Post.objects.filter(author_id__in=following).acount(),
+        'page': page
+    })
+
+
+@async_api(login_required=False)
+async def explore_view(request):
+    """Async explore_view"""
+    user = request.user
+    following = await following_user_ids(user) if user.is_authenticated else set()
+    posts = [post async for post in post_queryset(user).order_by('-created_at')[:EXPLORE_SIZE].aiterator()]
+    return json_response(await render_posts(request, posts, following))
+
+
+@async_api()
+async def notifications_view(request):
+    """Async NotificationListView, paginated like PageNumberPagination"""
+    notifications = Notification.objects.filter(
+        recipient=request.user
+    ).select_related('actor', 'actor__profile')
+
+    page = page_number(request)
+    start = (page - 1) * NOTIFICATIONS_PAGE_SIZE
+    rows = [row async for row in notifications[start:start + NOTIFICATIONS_PAGE_SIZE].aiterator()]
+    count = await notifications.acount()
+
+    post_ids = {row.target_id for row in rows if row.target_type == 'post' and row.target_id}
+    target_images = {
+        post_id: default_storage.url(image)
+        async for post_id, image in Post.objects.filter(id__in=post_ids).values_list('id', 'image')
+        if image
+    }
+
+    url = request.build_absolute_uri()
+    next_url = replace_query_param(url, 'page', page + 1) if start + NOTIFICATIONS_PAGE_SIZE < count else None
+    if page <= 1:
+        previous_url = None
+    elif page == 2:
+        previous_url = remove_query_param(url, 'page')
+    else:
+        previous_url = replace_query_param(url, 'page', page - 1)
+
+    serializer = PreloadedNotificationSerializer(
+        rows, many=True, context={'request': request, 'target_images': target_images}
+    )
+    return json_response({
+        'count': count,
+        'next': next_url,
+        'previous': previous_url,
+        'results': serializer.data
+    })
+
+
+@async_api()
+async def conversations_view(request):
+    """Async ConversationListView (primary inbox), with the same cursor pagination"""
+    # CursorPagination reads query_params and evaluates the page itself, so
+    # it runs in one sync hop; the page is a single query either way
+    drf_request = Request(request)
+    paginator = InboxCursorPagination()
+    rows = await sync_to_async(paginator.paginate_queryset)(
+        inbox_queryset(request.user, INBOX_PRIMARY), drf_request
+    )
+    serializer = InboxConversationSerializer(rows, many=True, context={'request': request})
+    return json_response(paginator.get_paginated_response(serializer.data).data)
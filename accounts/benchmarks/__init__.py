@@ -0,0 +1,33 @@
+"""
+Micro-benchmarks for hot paths, run with ``python manage.py benchmark <name>``.
+
+Each scenario is a function registered with ``@scenario`` that receives
+the parsed options and returns a dict of results to print.
+"""
+import time
+from contextlib import contextmanager
+
+
+SCENARIOS = {}
+
+
+def scenario(name):
+    """Register a benchmark function under name"""
+    def decorator(func):
+        SCENARIOS[name] = func
+        return func
+    return decorator
+
+
+@contextmanager
+def timer(results, key):
+    """Store the elapsed wall time of the block in results[key] (seconds)"""
+    start = time.perf_counter()
+    yield
+    results[key] = round(time.perf_counter() - start, 4)
+
+
+def load_scenarios():
+    """Import every scenario module so its @scenario functions register"""
+    from . import async_views, chat, fanout, frames, likes, sqlite  # noqa: F401
+    return SCENARIOS
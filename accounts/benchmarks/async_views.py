@@ -0,0 +1,121 @@
+"""
+Sync vs async read endpoints under concurrent load.
+
+Seeds a small social graph, then fires N requests per endpoint at a fixed
+concurrency through Django's ASGI handler (AsyncClient), once against the
+DRF views and once against their ``/api/async/`` counterparts.
+
+Reports throughput and worker-thread milliseconds per request: how long
+each request keeps a sync_to_async worker thread busy, sampled from the
+threads' stacks. A sync view holds its thread for the whole request; an
+async view only for each query. Thread counts alone do not show this,
+since both variants run their sync work on the same executor threads,
+so the thread pool a server needs scales with this number.
+"""
+import asyncio
+import sys
+import threading
+import time
+
+from django.contrib.auth.models import User
+from django.test import AsyncClient
+from rest_framework_simplejwt.tokens import AccessToken
+
+from accounts.models import Comment, Notification, Post
+from . import scenario
+
+
+CONCURRENCY = 50
+
+ENDPOINTS = {
+    'feed': ('/api/feed/', '/api/async/feed/'),
+    'explore': ('/api/explore/', '/api/async/explore/'),
+    'notifications': ('/api/notifications/', '/api/async/notifications/'),
+    'conversations': ('/api/conversations/', '/api/async/conversations/'),
+}
+
+
+def seed(authors=20, posts_per_author=5):
+    viewer = User.objects.create_user(username='bench_async_viewer')
+    # create_user, not bulk_create, so the profile signal runs
+    others = [User.objects.create_user(username=f'bench_async_{i}') for i in range(authors)]
+    viewer.profile.following.add(*[other.profile for other in others])
+    posts = Post.objects.bulk_create([
+        Post(author=author, caption=f'post {i}')
+        for author in others for i in range(posts_per_author)
+    ])
+    Comment.objects.bulk_create([
+        Comment(post=post, author=others[i % authors], text='nice')
+        for i, post in enumerate(posts) for _ in range(3)
+    ])
+    Notification.objects.bulk_create([
+        Notification(recipient=viewer, actor=others[i % authors], verb='like', target_type='post', target_id=post.id)
+        for i, post in enumerate(posts[:50])
+    ])
+    return viewer
+
+
+def busy_worker_threads():
+    """Number of executor threads currently running a work item"""
+    count = 0
+    for thread_id, frame in sys._current_frames().items():
+        if thread_id == threading.main_thread().ident:
+            continue
+        while frame is not None:
+            code = frame.f_code
+            if code.co_name == 'run' and code.co_filename.endswith('concurrent/futures/thread.py'):
+                count += 1
+                break
+            frame = frame.f_back
+    return count
+
+
+async def hammer(path, token, count):
+    """Run count GETs at CONCURRENCY; return (seconds, busy thread-seconds, errors)"""
+    client = AsyncClient()
+    semaphore = asyncio.Semaphore(CONCURRENCY)
+    busy = 0.0
+    errors = 0
+    done = False
+
+    async def sample():
+        nonlocal busy
+        last = time.perf_counter()
+        while not done:
+            await asyncio.sleep(0.002)
+            now = time.perf_counter()
+            busy += busy_worker_threads() * (now - last)
+            last = now
+
+    async def one():
+        nonlocal errors
+        async with semaphore:
+            response = await client.get(path, headers={'Authorization': f'Bearer {token}'})
+            if response.status_code != 200:
+                errors += 1
+
+    sampler = asyncio.ensure_future(sample())
+    start = time.perf_counter()
+    await asyncio.gather(*[one() for _ in range(count)])
+    elapsed = time.perf_counter() - start
+    done = True
+    await sampler
+    return elapsed, busy, errors
+
+
+@scenario('async_views')
+def async_views(options):
+    """N concurrent GETs per read endpoint, sync DRF views vs /api/async/ views"""
+    count = min(options['count'], 500)
+    viewer = seed()
+    token = str(AccessToken.for_user(viewer))
+
+    results = {'requests': count, 'concurrency': CONCURRENCY}
+    for name, (sync_path, async_path) in ENDPOINTS.items():
+        for variant, path in (('sync', sync_path), ('async', async_path)):
+            elapsed, busy, errors = asyncio.run(hammer(path, token, count))
+            results[f'{name}_{variant}_rps'] = round(count / elapsed) if elapsed else None
+            results[f'{name}_{variant}_thread_ms'] = round(busy * 1000 / count, 2)
+            if errors:
+                results[f'{name}_{variant}_errors'] = errors
+    return results
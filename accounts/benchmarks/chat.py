@@ -0,0 +1,60 @@
+import asyncio
+import json
+import time
+
+from channels.routing import URLRouter
+from channels.testing import WebsocketCommunicator
+from django.contrib.auth.models import User
+
+from accounts.models import Conversation
+from accounts.routing import websocket_urlpatterns
+from . import scenario
+
+
+def make_conversation(prefix='bench_chat'):
+    """Create two users and a conversation between them"""
+    sender = User.objects.create_user(username=f'{prefix}_sender')
+    receiver = User.objects.create_user(username=f'{prefix}_receiver')
+    conversation = Conversation.objects.create()
+    conversation.participants.add(sender, receiver)
+    return conversation, sender, receiver
+
+
+async def connect(conversation, user):
+    communicator = WebsocketCommunicator(
+        URLRouter(websocket_urlpatterns), f'/ws/chat/{conversation.id}/'
+    )
+    communicator.scope['user'] = user
+    connected, _ = await communicator.connect()
+    if not connected:
+        raise RuntimeError(f'{user.username} could not connect to conversation {conversation.id}')
+    return communicator
+
+
+async def send_messages(conversation, sender, receiver, count):
+    sending = await connect(conversation, sender)
+    receiving = await connect(conversation, receiver)
+    try:
+        start = time.perf_counter()
+        for i in range(count):
+            await sending.send_to(text_data=json.dumps({'type': 'message', 'message': f'message {i}'}))
+            # Wait for the broadcast to reach the other participant
+            await receiving.receive_from(timeout=5)
+            await sending.receive_from(timeout=5)
+        return time.perf_counter() - start
+    finally:
+        await sending.disconnect()
+        await receiving.disconnect()
+
+
+@scenario('chat_send')
+def chat_send(options):
+    """Send N chat messages through ChatConsumer and time the round trips"""
+    count = min(options['count'], 2000)
+    conversation, sender, receiver = make_conversation()
+    seconds = asyncio.run(send_messages(conversation, sender, receiver, count))
+    return {
+        'messages': count,
+        'seconds': round(seconds, 4),
+        'messages_per_second': round(count / seconds) if seconds else None,
+    }
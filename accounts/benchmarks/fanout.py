@@ -0,0 +1,105 @@
+"""
+Cross-process channel-layer fan-out.
+
+Starts sharded Redis-protocol stand-ins (see resp_server.py), spawns
+consumer processes that each join one group through
+``RedisPubSubChannelLayer`` and times group_send deliveries from the
+parent process, i.e. the path chat messages take when Daphne runs as
+several workers.
+"""
+import asyncio
+import multiprocessing
+import statistics
+import time
+
+from . import scenario
+from .resp_server import start_in_thread, stop_in_thread
+
+
+GROUP = 'bench_fanout'
+PREFIX = 'bench'
+
+
+def consume(hosts, expected, ready, results):
+    """Consumer process: join GROUP and report per-message latencies"""
+    from channels_redis.pubsub import RedisPubSubChannelLayer
+
+    async def run():
+        layer = RedisPubSubChannelLayer(hosts=hosts, prefix=PREFIX)
+        channel = await layer.new_channel()
+        await layer.group_add(GROUP, channel)
+        ready.set()
+
+        latencies = []
+        while len(latencies) < expected:
+            try:
+                message = await asyncio.wait_for(layer.receive(channel), timeout=10)
+            except asyncio.TimeoutError:
+                break
+            latencies.append(time.time() - message['sent_at'])
+        results.put(latencies)
+        await layer.flush()
+
+    asyncio.run(run())
+
+
+async def publish(hosts, count):
+    from channels_redis.pubsub import RedisPubSubChannelLayer
+
+    layer = RedisPubSubChannelLayer(hosts=hosts, prefix=PREFIX)
+    for i in range(count):
+        await layer.group_send(GROUP, {'type': 'chat.message', 'seq': i, 'sent_at': time.time()})
+    await layer.flush()
+
+
+def percentile(values, fraction):
+    if not values:
+        return None
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(len(ordered) * fraction))]
+
+
+@scenario('fanout')
+def fanout(options):
+    """Publish N group messages to consumer processes over 2 local RESP shards"""
+    count = min(options['count'], 5000)
+    processes = options.get('processes') or 4
+    servers = [start_in_thread() for _ in range(2)]
+    hosts = [server.url for server, _ in servers]
+
+    context = multiprocessing.get_context('spawn')
+    results = context.Queue()
+    workers = []
+    try:
+        for _ in range(processes):
+            ready = context.Event()
+            worker = context.Process(target=consume, args=(hosts, count, ready, results))
+            worker.start()
+            workers.append((worker, ready))
+        for _, ready in workers:
+            ready.wait(timeout=30)
+
+        start = time.perf_counter()
+        asyncio.run(publish(hosts, count))
+        latencies = []
+        for _ in workers:
+            latencies.extend(results.get(timeout=60))
+        elapsed = time.perf_counter() - start
+    finally:
+        for worker, _ in workers:
+            worker.join(timeout=10)
+            if worker.is_alive():
+                worker.terminate()
+        for server, loop in servers:
+            stop_in_thread(server, loop)
+
+    delivered = len(latencies)
+    return {
+        'processes': processes,
+        'messages': count,
+        'delivered': delivered,
+        'lost': count * processes - delivered,
+        'p50_ms': round(statistics.median(latencies) * 1000, 3) if latencies else None,
+        'p99_ms': round(percentile(latencies, 0.99) * 1000, 3) if latencies else None,
+        'deliveries_per_second': round(delivered / elapsed) if elapsed else None,
+    }
@@ -0,0 +1,64 @@
+"""
+WebSocket frame size and encode cost per codec (see accounts/codecs.py).
+
+Builds the message frames a busy conversation would push and encodes
+them as JSON, MessagePack, and MessagePack with sender references.
+"""
+import time
+
+from django.utils import timezone
+
+from accounts.codecs import JSONCodec, MsgpackCodec, SenderRefs
+from . import scenario
+
+
+def make_frames(count, senders=5):
+    now = timezone.now().isoformat()
+    users = [
+        {
+            'id': user_id,
+            'username': f'bench_user_{user_id}',
+            'profile': {'avatar': f'/media/avatars/bench_user_{user_id}.jpg'}
+        }
+        for user_id in range(1, senders + 1)
+    ]
+    return [
+        {
+            'type': 'message',
+            'conversation_id': 1,
+            'message': {
+                'id': i,
+                'conversation': 1,
+                'seq': i,
+                'text': f'message number {i}',
+                'sender': users[i % senders],
+                'created_at': now,
+                'is_read': False
+            }
+        }
+        for i in range(1, count + 1)
+    ]
+
+
+def measure(codec, frames, refs=None):
+    total = 0
+    start = time.perf_counter()
+    for frame in frames:
+        if refs:
+            frame = refs.pack(frame)
+        encoded = codec.encode(frame)
+        total += len(encoded.get('bytes_data') or encoded['text_data'].encode())
+    elapsed = time.perf_counter() - start
+    return round(total / len(frames), 1), round(elapsed / len(frames) * 1e6, 2)
+
+
+@scenario('frames')
+def frames(options):
+    """Bytes per message and encode microseconds for JSON vs MessagePack frames"""
+    message_frames = make_frames(options['count'])
+    results = {'messages': len(message_frames)}
+    results['json_bytes'], results['json_us'] = measure(JSONCodec(), message_frames)
+    msgpack = MsgpackCodec()
+    results['msgpack_bytes'], results['msgpack_us'] = measure(msgpack, message_frames)
+    results['msgpack_refs_bytes'], results['msgpack_refs_us'] = measure(msgpack, message_frames, SenderRefs())
+    return results
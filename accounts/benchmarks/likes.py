@@ -0,0 +1,29 @@
+from django.contrib.auth.models import User
+from django.db import connection
+from django.test.utils import CaptureQueriesContext
+
+from accounts.models import Notification, Post
+from . import scenario, timer
+
+
+@scenario('likes')
+def bulk_likes(options):
+    """Add N likes to one post in a single likes.add() call"""
+    count = options['count']
+    author = User.objects.create_user(username='bench_author')
+    post = Post.objects.create(author=author, caption='benchmark')
+    likers = User.objects.bulk_create(
+        [User(username=f'bench_liker_{i}') for i in range(count)],
+        batch_size=1000
+    )
+    liker_ids = [user.id for user in likers]
+
+    results = {'likes': count}
+    with CaptureQueriesContext(connection) as queries:
+        with timer(results, 'seconds'):
+            post.likes.add(*liker_ids)
+
+    results['queries'] = len(queries)
+    results['notifications'] = Notification.objects.filter(target_id=post.id, verb='like').count()
+    results['likes_per_second'] = round(count / results['seconds']) if results['seconds'] else None
+    return results
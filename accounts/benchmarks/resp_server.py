@@ -0,0 +1,191 @@
+"""
+Minimal Redis-protocol pub/sub server for local channel-layer tests.
+
+Implements just what ``channels_redis.pubsub.RedisPubSubChannelLayer``
+needs -- SUBSCRIBE, UNSUBSCRIBE, PUBLISH and PING -- so multi-process
+fan-out can be exercised without installing Redis. Clients that send
+``HELLO 3`` (redis-py 6 and later) get RESP3 replies and push frames.
+It does not implement EVAL, so the list-based
+``channels_redis.core.RedisChannelLayer`` needs a real Redis server.
+
+Run standalone with ``python -m accounts.benchmarks.resp_server --port 6390``.
+"""
+import argparse
+import asyncio
+import threading
+from collections import defaultdict
+
+
+def encode(value, resp3=False):
+    """Encode a Python value as a RESP2 (or RESP3) reply"""
+    if value is None:
+        return b'_\r\n' if resp3 else b'$-1\r\n'
+    if isinstance(value, int):
+        return b':%d\r\n' % value
+    if isinstance(value, str):
+        value = value.encode()
+    if isinstance(value, bytes):
+        return b'$%d\r\n%s\r\n' % (len(value), value)
+    if isinstance(value, (list, tuple)):
+        return b'*%d\r\n' % len(value) + b''.join(encode(item, resp3) for item in value)
+    if isinstance(value, dict):
+        if not resp3:
+            return encode([item for pair in value.items() for item in pair])
+        return b'%%%d\r\n' % len(value) + b''.join(
+            encode(key, resp3) + encode(item, resp3) for key, item in value.items()
+        )
+    raise TypeError(f'Cannot encode {type(value)!r}')
+
+
+def encode_push(items, resp3=False):
+    """Out-of-band pub/sub frame: a push type in RESP3, an array in RESP2"""
+    if not resp3:
+        return encode(items)
+    return b'>%d\r\n' % len(items) + b''.join(encode(item, resp3) for item in items)
+
+
+class RESPServer:
+    """Pub/sub broker speaking the Redis wire protocol"""
+
+    def __init__(self, host='127.0.0.1', port=0):
+        self.host = host
+        self.port = port
+        self.subscribers = defaultdict(set)  # channel -> set of writers
+        self.resp3 = set()                   # writers that negotiated RESP3
+        self._server = None
+
+    async def start(self):
+        self._server = await asyncio.start_server(self.handle_client, self.host, self.port)
+        self.port = self._server.sockets[0].getsockname()[1]
+        return self
+
+    async def close(self):
+        if self._server:
+            self._server.close()
+            await self._server.wait_closed()
+
+    @property
+    def url(self):
+        return f'redis://{self.host}:{self.port}/0'
+
+    async def read_command(self, reader):
+        line = await reader.readline()
+        if not line:
+            return None
+        if not line.startswith(b'*'):
+            # Inline command, e.g. "PING\r\n" from redis-cli
+            return line.strip().split()
+        args = []
+        for _ in range(int(line[1:])):
+            length = int((await reader.readline())[1:])
+            args.append((await reader.readexactly(length + 2))[:-2])
+        return args
+
+    async def handle_client(self, reader, writer):
+        subscribed = set()
+        try:
+            while True:
+                args = await self.read_command(reader)
+                if args is None:
+                    break
+                if not args:
+                    continue
+                command = args[0].upper()
+                reply = self.dispatch(command, args[1:], writer, subscribed)
+                if reply is not None:
+                    writer.write(reply)
+                    await writer.drain()
+                if command == b'QUIT':
+                    break
+        except (ConnectionError, asyncio.IncompleteReadError):
+            pass
+        finally:
+            for channel in subscribed:
+                self.subscribers[channel].discard(writer)
+            self.resp3.discard(writer)
+            writer.close()
+
+    def dispatch(self, command, args, writer, subscribed):
+        resp3 = writer in self.resp3
+        if command == b'PING':
+            if subscribed and not resp3:
+                return encode([b'pong', args[0] if args else b''])
+            return b'+PONG\r\n'
+        if command in (b'SELECT', b'QUIT', b'CLIENT'):
+            return b'+OK\r\n'
+        if command == b'HELLO':
+            version = int(args[0]) if args else 2
+            if version not in (2, 3):
+                return b'-NOPROTO unsupported protocol version\r\n'
+            if version == 3:
+                self.resp3.add(writer)
+            return encode({
+                b'server': b'redis', b'version': b'7.0.0', b'proto': version,
+                b'id': 1, b'mode': b'standalone', b'role': b'master', b'modules': []
+            }, resp3=version == 3)
+        if command == b'ECHO':
+            return encode(args[0])
+        if command == b'SUBSCRIBE':
+            replies = []
+            for channel in args:
+                subscribed.add(channel)
+                self.subscribers[channel].add(writer)
+                replies.append(encode_push([b'subscribe', channel, len(subscribed)], resp3))
+            return b''.join(replies)
+        if command == b'UNSUBSCRIBE':
+            channels = args or sorted(subscribed)
+            if not channels:
+                return encode_push([b'unsubscribe', None, 0], resp3)
+            replies = []
+            for channel in channels:
+                subscribed.discard(channel)
+                self.subscribers[channel].discard(writer)
+                replies.append(encode_push([b'unsubscribe', channel, len(subscribed)], resp3))
+            return b''.join(replies)
+        if command == b'PUBLISH':
+            channel, payload = args
+            receivers = self.subscribers.get(channel, ())
+            for subscriber in list(receivers):
+                subscriber.write(encode_push([b'message', channel, payload], subscriber in self.resp3))
+            return encode(len(receivers))
+        return b'-ERR unknown command \'%s\'\r\n' % command.lower()
+
+
+def start_in_thread(host='127.0.0.1', port=0):
+    """Run a RESPServer on a background event loop; returns (server, loop)"""
+    loop = asyncio.new_event_loop()
+    ready = threading.Event()
+    holder = {}
+
+    def run():
+        asyncio.set_event_loop(loop)
+        holder['server'] = loop.run_until_complete(RESPServer(host, port).start())
+        ready.set()
+        loop.run_forever()
+
+    threading.Thread(target=run, daemon=True).start()
+    ready.wait()
+    return holder['server'], loop
+
+
+def stop_in_thread(server, loop):
+    asyncio.run_coroutine_threadsafe(server.close(), loop).result()
+    loop.call_soon_threadsafe(loop.stop)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--port', type=int, default=6390)
+    args = parser.parse_args()
+
+    async def serve():
+        server = await RESPServer(args.host, args.port).start()
+        print(f'Listening on {server.url}')
+        await asyncio.Event().wait()
+
+    asyncio.run(serve())
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,105 @@
+"""
+SQLite read/write concurrency with and without the production pragmas.
+
+Runs reader and writer threads against a scratch database file (the
+benchmark test database is in memory, where journal modes don't apply)
+for a fixed duration, once with SQLite's defaults and once with
+settings.SQLITE_PRAGMAS. Writers insert like-sized rows in short
+transactions; readers run indexed lookups. sqlite3 releases the GIL
+while it waits, so threads contend on the database lock much like
+worker threads do.
+"""
+import os
+import random
+import sqlite3
+import tempfile
+import threading
+import time
+
+from django.conf import settings
+
+from accounts.db import pragma_statements
+from . import scenario
+
+
+DURATION = 3.0
+READERS = 4
+WRITERS = 4
+
+
+def run(pragmas, timeout):
+    directory = tempfile.mkdtemp(prefix='bench_sqlite_')
+    path = os.path.join(directory, 'bench.sqlite3')
+
+    def connect():
+        connection = sqlite3.connect(path, timeout=timeout, isolation_level=None, check_same_thread=False)
+        for statement in pragma_statements(pragmas):
+            connection.execute(statement)
+        return connection
+
+    setup = connect()
+    setup.execute('CREATE TABLE likes (id INTEGER PRIMARY KEY, post_id INTEGER, user_id INTEGER)')
+    setup.execute('CREATE INDEX likes_post ON likes (post_id)')
+    setup.executemany('INSERT INTO likes (post_id, user_id) VALUES (?, ?)',
+                      [(i % 1000, i) for i in range(20000)])
+    setup.close()
+
+    counts = {'reads': 0, 'writes': 0, 'locked': 0}
+    lock = threading.Lock()
+    deadline = time.monotonic() + DURATION
+
+    def reader():
+        connection = connect()
+        done = 0
+        while time.monotonic() < deadline:
+            connection.execute('SELECT COUNT(*) FROM likes WHERE post_id = ?', (random.randrange(1000),)).fetchone()
+            done += 1
+        connection.close()
+        with lock:
+            counts['reads'] += done
+
+    def writer():
+        connection = connect()
+        done = locked = 0
+        while time.monotonic() < deadline:
+            try:
+                connection.execute('BEGIN IMMEDIATE')
+                connection.execute('INSERT INTO likes (post_id, user_id) VALUES (?, ?)',
+                                   (random.randrange(1000), random.randrange(100000)))
+                connection.execute('COMMIT')
+                done += 1
+            except sqlite3.OperationalError:
+                locked += 1
+                if connection.in_transaction:
+                    connection.execute('ROLLBACK')
+        connection.close()
+        with lock:
+            counts['writes'] += done
+            counts['locked'] += locked
+
+    threads = [threading.Thread(target=reader) for _ in range(READERS)]
+    threads += [threading.Thread(target=writer) for _ in range(WRITERS)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    for suffix in ('', '-wal', '-shm'):
+        if os.path.exists(path + suffix):
+            os.remove(path + suffix)
+    os.rmdir(directory)
+    return counts
+
+
+@scenario('sqlite_concurrency')
+def sqlite_concurrency(options):
+    """Read/write throughput with 4 readers and 4 writers, default vs configured pragmas"""
+    timeout = settings.DATABASES['default'].get('OPTIONS', {}).get('timeout', 5)
+    results = {'seconds': DURATION}
+    profiles = {'default': {}, 'configured': getattr(settings, 'SQLITE_PRAGMAS', {})}
+    for name, pragmas in profiles.items():
+        counts = run(pragmas, timeout)
+        results[f'{name}_reads_per_second'] = round(counts['reads'] / DURATION)
+        results[f'{name}_writes_per_second'] = round(counts['writes'] / DURATION)
+        results[f'{name}_locked'] = counts['locked']
+    return results
@@ -0,0 +1,122 @@
+"""
+Bounded in-process TTL caches for authentication hot paths.
+
+Every WebSocket handshake and every JWT-authenticated API request
+resolves a token to a user. Handshakes cache the resolved user per token
+id (``jti``); API requests cache the user and profile per user id. Both
+are dropped when the user or profile is saved or deleted in this
+process, and otherwise expire after ``ttl`` seconds, which bounds how
+long a deactivation made by another process goes unnoticed. Token
+entries also never outlive their token.
+"""
+import copy
+import threading
+import time
+from collections import OrderedDict
+
+
+class TTLCache:
+    """LRU mapping with per-entry expiry and tag-based invalidation"""
+
+    def __init__(self, maxsize=10000, ttl=300):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self._entries = OrderedDict()   # key -> (expires_at, tag, value)
+        self._tags = {}                 # tag -> set of keys
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        """Cached value for key, or None if missing or expired"""
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return None
+            expires_at, _, value = entry
+            if expires_at <= time.monotonic():
+                self._remove(key)
+                return None
+            self._entries.move_to_end(key)
+            return value
+
+    def set(self, key, value, ttl=None, tag=None):
+        """Store value for min(ttl, self.ttl) seconds; tag groups keys for delete_tag()"""
+        ttl = self.ttl if ttl is None else min(ttl, self.ttl)
+        if ttl <= 0:
+            return
+        with self._lock:
+            self._remove(key)
+            self._entries[key] = (time.monotonic() + ttl, tag, value)
+            if tag is not None:
+                self._tags.setdefault(tag, set()).add(key)
+            while len(self._entries) > self.maxsize:
+                self._remove(next(iter(self._entries)))
+
+    def delete(self, key):
+        with self._lock:
+            self._remove(key)
+
+    def delete_tag(self, tag):
+        """Drop every entry stored with tag"""
+        with self._lock:
+            for key in list(self._tags.get(tag, ())):
+                self._remove(key)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self._tags.clear()
+
+    def __len__(self):
+        return len(self._entries)
+
+    def _remove(self, key):
+        entry = self._entries.pop(key, None)
+        if entry is None or entry[1] is None:
+            return
+        keys = self._tags.get(entry[1])
+        if keys is not None:
+            keys.discard(key)
+            if not keys:
+                del self._tags[entry[1]]
+
+
+# jti -> User (with profile), tagged with the user id
+token_users = TTLCache(maxsize=10000, ttl=300)
+
+# str(user id) -> User (with profile); simplejwt puts the id in tokens as a string
+users = TTLCache(maxsize=10000, ttl=60)
+
+
+def copy_user(user):
+    """Copy of user and its loaded profile, so callers can't mutate the cached instances"""
+    user = copy.copy(user)
+    profile = user._state.fields_cache.get('profile')
+    if profile is not None:
+        profile = copy.copy(profile)
+        profile._state.fields_cache['user'] = user
+        user._state.fields_cache['profile'] = profile
+    return user
+
+
+def get_token_user(jti):
+    user = token_users.get(jti)
+    return copy_user(user) if user is not None else None
+
+
+def set_token_user(jti, user, expires_at):
+    """Cache user for jti until at most expires_at (a Unix timestamp)"""
+    token_users.set(jti, copy_user(user), ttl=expires_at - time.time(), tag=user.pk)
+
+
+def get_user(user_id):
+    user = users.get(str(user_id))
+    return copy_user(user) if user is not None else None
+
+
+def set_user(user):
+    users.set(str(user.pk), copy_user(user))
+
+
+def invalidate_user(user_id):
+    token_users.delete_tag(user_id)
+    users.delete(str(user_id))
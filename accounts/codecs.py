@@ -0,0 +1,85 @@
+"""
+WebSocket frame encodings for the chat and inbox consumers.
+
+JSON text frames remain the default. Clients can opt into MessagePack
+binary frames by offering the ``msgpack`` subprotocol or by connecting
+with ``?encoding=msgpack``. MessagePack frames also use sender references:
+a message carries only its sender's id, and the first frame from that
+sender on a socket adds the full user object under ``users``.
+"""
+import json
+from urllib.parse import parse_qs
+
+
+class JSONCodec:
+    name = 'json'
+    sender_refs = False
+
+    def encode(self, frame):
+        """Keyword arguments for AsyncWebsocketConsumer.send()"""
+        return {'text_data': json.dumps(frame)}
+
+    def decode(self, text_data=None, bytes_data=None):
+        return json.loads(text_data if text_data is not None else bytes_data)
+
+
+class MsgpackCodec:
+    name = 'msgpack'
+    sender_refs = True
+
+    def __init__(self):
+        import msgpack
+        self._packb = msgpack.packb
+        self._unpackb = msgpack.unpackb
+
+    def encode(self, frame):
+        return {'bytes_data': self._packb(frame)}
+
+    def decode(self, text_data=None, bytes_data=None):
+        if bytes_data is None:
+            # Control frames may still arrive as text
+            return json.loads(text_data)
+        return self._unpackb(bytes_data, strict_map_key=False)
+
+
+CODECS = {
+    JSONCodec.name: JSONCodec,
+    MsgpackCodec.name: MsgpackCodec,
+}
+
+
+def negotiate(scope):
+    """Return (codec, subprotocol to accept) for a connecting socket"""
+    for subprotocol in scope.get('subprotocols') or []:
+        if subprotocol in CODECS:
+            return CODECS[subprotocol](), subprotocol
+    query = parse_qs(scope.get('query_string', b'').decode())
+    encoding = query.get('encoding', [JSONCodec.name])[0]
+    return CODECS.get(encoding, JSONCodec)(), None
+
+
+class SenderRefs:
+    """Replace repeated sender objects with ids, once per socket"""
+
+    def __init__(self):
+        self.known = set()
+
+    def pack(self, frame):
+        """Copy of frame with sender refs and any newly seen users attached"""
+        users = {}
+        if 'message' in frame:
+            frame = {**frame, 'message': self._ref(frame['message'], users)}
+        if 'messages' in frame:
+            frame = {**frame, 'messages': [self._ref(message, users) for message in frame['messages']]}
+        if users:
+            frame['users'] = users
+        return frame
+
+    def _ref(self, message, users):
+        sender = message.get('sender')
+        if not isinstance(sender, dict):
+            return message
+        if sender['id'] not in self.known:
+            self.known.add(sender['id'])
+            users[sender['id']] = sender
+        return {**message, 'sender': sender['id']}
@@ -1,14 +1,250 @@
-import json
+import asyncio
+import time
+from urllib.parse import parse_qs
 from channels.generic.websocket import AsyncWebsocketConsumer
 from channels.db import database_sync_to_async
 from django.contrib.auth.models import User
+from django.db import transaction
 from .models import Conversation, Message
+from . import metrics, presence, replay
+from .codecs import SenderRefs, negotiate
 
 
-class ChatConsumer(AsyncWebsocketConsumer):
+# Typing indicators: clients send a frame per keystroke, but peers only need
+# start/stop transitions. Starts are forwarded at most once per interval and
+# a start with no follow-up frame expires into a stop.
+TYPING_MIN_INTERVAL = 1.0
+TYPING_EXPIRY = 5.0
+
+
+def chat_group(conversation_id):
+    """Channel-layer group of everyone watching a conversation"""
+    return f'chat_{conversation_id}'
+
+
+def user_group(user_id):
+    """Channel-layer group of every inbox socket a user has open"""
+    return f'user_{user_id}'
+
+
+def user_snapshot(user):
+    """Sender fields broadcast with every message, built once per connection"""
+    profile = getattr(user, 'profile', None)
+    return {
+        'id': user.id,
+        'username': user.username,
+        'profile': {
+            'avatar': profile.avatar.url if profile and profile.avatar else None
+        }
+    }
+
+
+def message_payload(message, sender):
+    """Broadcast dict for a saved message and its sender snapshot"""
+    return {
+        'id': message.id,
+        'conversation': message.conversation_id,
+        'seq': message.seq,
+        'text': message.text,
+        'sender': sender,
+        'created_at': message.created_at.isoformat(),
+        # Nobody but the sender has read a message that was just sent;
+        # replays refresh this from the read watermarks
+        'is_read': False
+    }
+
+
+class TypingState:
+    """Typing state of the connected user in one conversation"""
+    __slots__ = ('is_typing', 'forwarded_at', 'expiry')
+    
+    def __init__(self):
+        self.is_typing = False
+        self.forwarded_at = 0.0
+        self.expiry = None
+
+
+class BaseChatConsumer(AsyncWebsocketConsumer):
+    """Message sending and typing logic shared by the chat and inbox sockets.
+    
+    Subclasses fill ``self.conversations`` (conversation id -> participant
+    ids) and ``self.sender`` during connect.
+    """
+    
+    async def accept_negotiated(self):
+        """Accept with the frame encoding the client asked for (see codecs)"""
+        self.codec, subprotocol = negotiate(self.scope)
+        self.sender_refs = SenderRefs() if self.codec.sender_refs else None
+        await self.accept(subprotocol)
+    
+    async def send_frame(self, frame):
+        if self.sender_refs:
+            frame = self.sender_refs.pack(frame)
+        await self.send(**self.codec.encode(frame))
+    
+    async def presence_connected(self):
+        self.heartbeat_at = time.monotonic()
+        await presence.connected(self.scope['user'].id)
+    
+    async def presence_disconnected(self):
+        await presence.disconnected(self.scope['user'].id)
+        await self.flush_last_seen_if_due()
+    
+    async def handle_heartbeat(self):
+        """Refresh presence, writing at most once per HEARTBEAT_MIN_INTERVAL"""
+        now = time.monotonic()
+        if now - self.heartbeat_at < presence.HEARTBEAT_MIN_INTERVAL:
+            return
+        self.heartbeat_at = now
+        await presence.heartbeat(self.scope['user'].id)
+        await self.flush_last_seen_if_due()
+    
+    async def flush_last_seen_if_due(self):
+        if presence.last_seen.is_due():
+            await database_sync_to_async(presence.last_seen.flush)()
+    
+    async def join_conversation(self, conversation_id, participant_ids):
+        self.conversations[conversation_id] = participant_ids
+        await self.channel_layer.group_add(chat_group(conversation_id), self.channel_name)
+    
+    async def leave_all(self):
+        for conversation_id, state in getattr(self, 'typing', {}).items():
+            if state.is_typing:
+                await self.set_typing(conversation_id, False)
+            if state.expiry:
+                state.expiry.cancel()
+        for conversation_id in getattr(self, 'conversations', {}):
+            await self.channel_layer.group_discard(chat_group(conversation_id), self.channel_name)
+    
+    async def send_chat_message(self, conversation_id, text):
+        """Save text, broadcast it to the conversation and push inbox updates"""
+        if not text.strip():
+            return
+        
+        # Sending a message ends the typing state
+        state = self.typing.get(conversation_id)
+        if state and state.is_typing:
+            await self.set_typing(conversation_id, False)
+        
+        # Insert the message and bump the conversation in one hop
+        message = await self.save_message(self.scope['user'], conversation_id, text)
+        await broadcast_message(
+            self.channel_layer,
+            conversation_id,
+            self.get_message_data(message),
+            self.conversations[conversation_id]
+        )
+    
+    async def handle_typing(self, conversation_id, is_typing):
+        """Forward typing transitions only, rate-limiting starts"""
+        state = self.typing.setdefault(conversation_id, TypingState())
+        if is_typing:
+            self.schedule_typing_expiry(conversation_id, state)
+        
+        if is_typing == state.is_typing:
+            metrics.incr('typing.dropped')
+            return
+        if is_typing and time.monotonic() - state.forwarded_at < TYPING_MIN_INTERVAL:
+            metrics.incr('typing.dropped')
+            return
+        
+        await self.set_typing(conversation_id, is_typing)
+    
+    async def set_typing(self, conversation_id, is_typing):
+        """Record and broadcast a typing state change"""
+        state = self.typing.setdefault(conversation_id, TypingState())
+        state.is_typing = is_typing
+        state.forwarded_at = time.monotonic()
+        if not is_typing and state.expiry:
+            state.expiry.cancel()
+            state.expiry = None
+        
+        metrics.incr('typing.forwarded')
+        await self.channel_layer.group_send(
+            chat_group(conversation_id),
+            {
+                'type': 'typing_indicator',
+                'conversation_id': conversation_id,
+                'user_id': self.scope['user'].id,
+                'username': self.scope['user'].username,
+                'is_typing': is_typing
+            }
+        )
+    
+    def schedule_typing_expiry(self, conversation_id, state):
+        if state.expiry:
+            state.expiry.cancel()
+        state.expiry = asyncio.ensure_future(self.expire_typing(conversation_id, state))
+    
+    async def expire_typing(self, conversation_id, state):
+        await asyncio.sleep(TYPING_EXPIRY)
+        state.expiry = None
+        if state.is_typing:
+            metrics.incr('typing.expired')
+            await self.set_typing(conversation_id, False)
+    
+    @database_sync_to_async
+    def load_sender(self, user):
+        user = User.objects.select_related('profile').get(pk=user.pk)
+        return user_snapshot(user)
+    
+    @database_sync_to_async
+    def save_message(self, user, conversation_id, text):
+        """Insert the message and add it to the replay buffer once committed"""
+        with transaction.atomic():
+            message = Message.objects.create(
+                conversation_id=conversation_id,
+                sender_id=user.id,
+                text=text
+            )
+        replay.remember(conversation_id, self.get_message_data(message))
+        return message
+    
+    def get_message_data(self, message):
+        """Build the broadcast payload from the saved instance and sender snapshot"""
+        return message_payload(message, self.sender)
+    
+    async def resume(self, conversation_id, last_seq):
+        """Send the messages after last_seq, or ask the client to resync"""
+        messages = await self.get_missed(conversation_id, last_seq)
+        if messages is None:
+            metrics.incr('replay.resync')
+            await self.send_frame({
+                'type': 'resync',
+                'conversation_id': conversation_id
+            })
+            return
+        metrics.incr('replay.messages', len(messages))
+        await self.send_frame({
+            'type': 'replay',
+            'conversation_id': conversation_id,
+            'messages': messages
+        })
+    
+    @database_sync_to_async
+    def get_missed(self, conversation_id, last_seq):
+        return replay.missed_messages(
+            conversation_id,
+            last_seq,
+            lambda message: message_payload(message, user_snapshot(message.sender))
+        )
+    
+    # Inbox updates are only delivered to InboxConsumer sockets
+    async def inbox_update(self, event):
+        pass
+    
+    async def conversation_created(self, event):
+        pass
+
+
+class ChatConsumer(BaseChatConsumer):
+    """One socket per conversation: ws/chat/<conversation_id>/"""
+    
     async def connect(self):
-        self.conversation_id = self.scope['url_route']['kwargs']['conversation_id']
-        self.room_group_name = f'chat_{self.conversation_id}'
+        self.conversation_id = int(self.scope['url_route']['kwargs']['conversation_id'])
+        self.room_group_name = chat_group(self.conversation_id)
+        self.conversations = {}
+        self.typing = {}
         
         # Check if user is authenticated
         user = self.scope['user']
@@ -16,121 +252,255 @@ class ChatConsumer(AsyncWebsocketConsumer):
             await self.close()
             return
         
-        # Check if user is participant in conversation
-        is_participant = await self.is_user_participant(user, self.conversation_id)
-        if not is_participant:
+        # Check participation and snapshot the sender
+        participant_ids = await self.get_participant_ids(self.conversation_id)
+        if user.id not in participant_ids:
             await self.close()
             return
+        self.sender = await self.load_sender(user)
         
         # Join room group
-        await self.channel_layer.group_add(
-            self.room_group_name,
-            self.channel_name
-        )
+        await self.join_conversation(self.conversation_id, participant_ids)
         
-        await self.accept()
+        await self.accept_negotiated()
+        await self.presence_connected()
+        
+        # Reconnecting clients pass the seq of the last message they saw
+        query = parse_qs(self.scope.get('query_string', b'').decode())
+        last_seq = parse_seq(query.get('last_seq', [None])[0])
+        if last_seq is not None:
+            await self.resume(self.conversation_id, last_seq)
     
     async def disconnect(self, close_code):
         # Leave room group
-        await self.channel_layer.group_discard(
-            self.room_group_name,
-            self.channel_name
-        )
+        await self.leave_all()
+        if getattr(self, 'sender', None):
+            await self.presence_disconnected()
     
     # Receive message from WebSocket
-    async def receive(self, text_data):
-        data = json.loads(text_data)
+    async def receive(self, text_data=None, bytes_data=None):
+        data = self.codec.decode(text_data, bytes_data)
         message_type = data.get('type', 'message')
         
         if message_type == 'message':
-            message_text = data.get('message', '')
-            
-            # Save message to database
-            message = await self.save_message(
-                self.scope['user'],
-                self.conversation_id,
-                message_text
-            )
-            
-            # Get message data with related fields
-            message_data = await self.get_message_data(message.id)
-            
-            # Send message to room group
-            await self.channel_layer.group_send(
-                self.room_group_name,
-                {
-                    'type': 'chat_message',
-                    'message': message_data
-                }
-            )
+            await self.send_chat_message(self.conversation_id, data.get('message', ''))
         elif message_type == 'typing':
-            # Broadcast typing indicator
-            await self.channel_layer.group_send(
-                self.room_group_name,
-                {
-                    'type': 'typing_indicator',
-                    'user_id': self.scope['user'].id,
-                    'username': self.scope['user'].username,
-                    'is_typing': data.get('is_typing', False)
-                }
-            )
+            await self.handle_typing(self.conversation_id, bool(data.get('is_typing', False)))
+        elif message_type == 'heartbeat':
+            await self.handle_heartbeat()
+        elif message_type == 'resume':
+            last_seq = parse_seq(data.get('last_seq'))
+            if last_seq is not None:
+                await self.resume(self.conversation_id, last_seq)
     
     # Receive message from room group
     async def chat_message(self, event):
         message = event['message']
         
         # Send message to WebSocket
-        await self.send(text_data=json.dumps({
+        await self.send_frame({
             'type': 'message',
             'message': message
-        }))
+        })
     
     # Receive typing indicator from room group
     async def typing_indicator(self, event):
         # Don't send typing indicator to the user who is typing
         if event['user_id'] != self.scope['user'].id:
-            await self.send(text_data=json.dumps({
+            await self.send_frame({
                 'type': 'typing',
                 'username': event['username'],
                 'is_typing': event['is_typing']
-            }))
-    
-    @database_sync_to_async
-    def is_user_participant(self, user, conversation_id):
-        try:
-            conversation = Conversation.objects.get(id=conversation_id)
-            return user in conversation.participants.all()
-        except Conversation.DoesNotExist:
-            return False
+            })
     
     @database_sync_to_async
-    def save_message(self, user, conversation_id, text):
-        conversation = Conversation.objects.get(id=conversation_id)
-        message = Message.objects.create(
-            conversation=conversation,
-            sender=user,
-            text=text
+    def get_participant_ids(self, conversation_id):
+        return list(
+            Conversation.participants.through.objects.filter(
+                conversation_id=conversation_id
+            ).values_list('user_id', flat=True)
         )
+
+
+class InboxConsumer(BaseChatConsumer):
+    """One socket per user for all conversations: ws/inbox/
+    
+    Frames carry a ``conversation_id``; the socket also receives inbox
+    updates for every conversation and joins new ones as they are created.
+    """
+    
+    async def connect(self):
+        self.conversations = {}
+        self.typing = {}
         
-        # Update conversation's updated_at timestamp
-        conversation.save()
+        user = self.scope['user']
+        if not user.is_authenticated:
+            await self.close()
+            return
         
-        return message
+        self.sender = await self.load_sender(user)
+        memberships = await self.get_memberships(user)
+        for conversation_id, participant_ids in memberships.items():
+            await self.join_conversation(conversation_id, participant_ids)
+        await self.channel_layer.group_add(user_group(user.id), self.channel_name)
+        
+        await self.accept_negotiated()
+        await self.presence_connected()
+        await self.send_frame({
+            'type': 'subscribed',
+            'conversation_ids': list(self.conversations)
+        })
+    
+    async def disconnect(self, close_code):
+        await self.leave_all()
+        user = self.scope['user']
+        if user.is_authenticated:
+            await self.channel_layer.group_discard(user_group(user.id), self.channel_name)
+            await self.presence_disconnected()
+    
+    async def receive(self, text_data=None, bytes_data=None):
+        data = self.codec.decode(text_data, bytes_data)
+        message_type = data.get('type', 'message')
+        if message_type == 'heartbeat':
+            await self.handle_heartbeat()
+            return
+        if message_type == 'resume':
+            # {"type": "resume", "cursors": {"<conversation_id>": <last_seq>, ...}}
+            for key, value in (data.get('cursors') or {}).items():
+                conversation_id, last_seq = parse_seq(key), parse_seq(value)
+                if conversation_id in self.conversations and last_seq is not None:
+                    await self.resume(conversation_id, last_seq)
+            return
+        try:
+            conversation_id = int(data.get('conversation_id'))
+        except (TypeError, ValueError):
+            conversation_id = None
+        
+        if conversation_id not in self.conversations:
+            await self.send_frame({
+                'type': 'error',
+                'error': 'Unknown conversation',
+                'conversation_id': data.get('conversation_id')
+            })
+            return
+        
+        if message_type == 'message':
+            await self.send_chat_message(conversation_id, data.get('message', ''))
+        elif message_type == 'typing':
+            await self.handle_typing(conversation_id, bool(data.get('is_typing', False)))
+    
+    async def chat_message(self, event):
+        await self.send_frame({
+            'type': 'message',
+            'conversation_id': event['conversation_id'],
+            'message': event['message']
+        })
+    
+    async def typing_indicator(self, event):
+        if event['user_id'] != self.scope['user'].id:
+            await self.send_frame({
+                'type': 'typing',
+                'conversation_id': event['conversation_id'],
+                'username': event['username'],
+                'is_typing': event['is_typing']
+            })
+    
+    async def inbox_update(self, event):
+        # Joined conversations already delivered the message through chat_message
+        if event['conversation_id'] in self.conversations:
+            return
+        await self.send_frame({
+            'type': 'inbox_update',
+            'conversation_id': event['conversation_id'],
+            'message': event['message']
+        })
+    
+    async def conversation_created(self, event):
+        """Join a conversation created after this socket connected"""
+        conversation_id = event['conversation_id']
+        if conversation_id not in self.conversations:
+            await self.join_conversation(conversation_id, event['participant_ids'])
+        await self.send_frame({
+            'type': 'conversation_created',
+            'conversation_id': conversation_id
+        })
     
     @database_sync_to_async
-    def get_message_data(self, message_id):
-        """Get message data with related fields for serialization"""
-        message = Message.objects.select_related('sender', 'sender__profile').get(id=message_id)
-        return {
-            'id': message.id,
-            'text': message.text,
-            'sender': {
-                'id': message.sender.id,
-                'username': message.sender.username,
-                'profile': {
-                    'avatar': message.sender.profile.avatar.url if message.sender.profile.avatar else None
-                }
-            },
-            'created_at': message.created_at.isoformat(),
-            'is_read': message.is_read
+    def get_memberships(self, user):
+        """Map each of user's conversations to its participant ids in one query"""
+        Participant = Conversation.participants.through
+        memberships = {}
+        rows = Participant.objects.filter(
+            conversation__participants=user
+        ).values_list('conversation_id', 'user_id')
+        for conversation_id, user_id in rows:
+            memberships.setdefault(conversation_id, []).append(user_id)
+        return memberships
+
+
+def parse_seq(value):
+    """Non-negative int from a client-supplied value, or None"""
+    try:
+        value = int(value)
+    except (TypeError, ValueError):
+        return None
+    return value if value >= 0 else None
+
+
+async def broadcast_message(channel_layer, conversation_id, message_data, participant_ids):
+    """Send a saved message to the conversation's sockets and refresh inboxes"""
+    await channel_layer.group_send(
+        chat_group(conversation_id),
+        {
+            'type': 'chat_message',
+            'conversation_id': conversation_id,
+            'message': message_data
         }
+    )
+    # Inbox sockets that have not joined the conversation yet
+    for user_id in participant_ids:
+        await channel_layer.group_send(
+            user_group(user_id),
+            {
+                'type': 'inbox_update',
+                'conversation_id': conversation_id,
+                'message': message_data
+            }
+        )
+
+
+def notify_message_created(message, sender, participant_ids):
+    """Buffer and broadcast a message saved outside a socket, e.g. through the REST API"""
+    from asgiref.sync import async_to_sync
+    from channels.layers import get_channel_layer
+    
+    message_data = message_payload(message, user_snapshot(sender))
+    replay.remember(message.conversation_id, message_data)
+    channel_layer = get_channel_layer()
+    if channel_layer is None:
+        return
+    async_to_sync(broadcast_message)(
+        channel_layer,
+        message.conversation_id,
+        message_data,
+        participant_ids
+    )
+
+
+def notify_conversation_created(conversation_id, participant_ids):
+    """Tell the participants' open inbox sockets to join a new conversation"""
+    from asgiref.sync import async_to_sync
+    from channels.layers import get_channel_layer
+    
+    channel_layer = get_channel_layer()
+    if channel_layer is None:
+        return
+    for user_id in participant_ids:
+        async_to_sync(channel_layer.group_send)(
+            user_group(user_id),
+            {
+                'type': 'conversation_created',
+                'conversation_id': conversation_id,
+                'participant_ids': list(participant_ids)
+            }
+        )
@@ -0,0 +1,83 @@
+"""
+Buffered counters for denormalized count columns.
+
+Hot rows (e.g. the like count of a celebrity post) would otherwise take
+one UPDATE per tap, all serialized on the same row and on SQLite's
+single writer lock. Deltas are summed in process memory instead and
+applied in one UPDATE per distinct delta every ``flush_interval`` seconds.
+Each process flushes its own deltas, so the stored value converges to
+the true count without cross-process coordination.
+"""
+import atexit
+import threading
+from collections import defaultdict
+
+from django.db import connection, transaction
+from django.db.models import F
+
+
+class BufferedCounter:
+    """Accumulate per-row deltas for model.field and write them in batches"""
+
+    def __init__(self, model, field, flush_interval=2.0, max_pending=1000):
+        self.model = model
+        self.field = field
+        self.flush_interval = flush_interval
+        self.max_pending = max_pending
+        self._pending = defaultdict(int)
+        self._lock = threading.Lock()
+        self._timer = None
+        atexit.register(self.flush)
+
+    def add(self, pk, delta=1):
+        """Record delta for the row with primary key pk"""
+        if not delta:
+            return
+        with self._lock:
+            self._pending[pk] += delta
+            flush_now = len(self._pending) >= self.max_pending
+            if not flush_now and self._timer is None:
+                self._timer = threading.Timer(self.flush_interval, self._flush_in_background)
+                self._timer.daemon = True
+                self._timer.start()
+        if flush_now:
+            self.flush()
+
+    def add_on_commit(self, pk, delta=1):
+        """add() once the current transaction commits, so rollbacks leave no delta"""
+        if delta:
+            transaction.on_commit(lambda: self.add(pk, delta))
+
+    def pending(self, pk):
+        """Delta recorded for pk in this process but not yet written"""
+        return self._pending.get(pk, 0)
+
+    def flush(self):
+        """Write all pending deltas, one UPDATE per distinct delta value"""
+        with self._lock:
+            pending, self._pending = self._pending, defaultdict(int)
+            if self._timer is not None:
+                self._timer.cancel()
+                self._timer = None
+
+        by_delta = defaultdict(list)
+        for pk, delta in pending.items():
+            if delta:
+                by_delta[delta].append(pk)
+
+        if not by_delta:
+            return 0
+
+        with transaction.atomic():
+            for delta, pks in by_delta.items():
+                self.model.objects.filter(pk__in=pks).update(
+                    **{self.field: F(self.field) + delta}
+                )
+        return len(pending)
+
+    def _flush_in_background(self):
+        try:
+            self.flush()
+        finally:
+            # Timer threads get their own connection; don't leak it
+            connection.close()
@@ -0,0 +1,31 @@
+"""
+Per-connection SQLite tuning.
+
+Django opens SQLite connections with the stock rollback journal, where
+every write blocks all readers. ``apply_sqlite_pragmas`` runs on
+``connection_created`` and applies settings.SQLITE_PRAGMAS (WAL,
+synchronous=NORMAL, cache and mmap sizes, busy timeout). journal_mode
+is persistent in the database file; the rest are per connection, which
+is why CONN_MAX_AGE keeps connections open across requests. Replica
+connections skip journal_mode: setting it writes to the file, which
+fails on read-only replica copies.
+"""
+from django.conf import settings
+
+
+def pragma_statements(pragmas):
+    return [f'PRAGMA {name} = {value}' for name, value in pragmas.items()]
+
+
+def apply_sqlite_pragmas(sender, connection, **kwargs):
+    """connection_created hook"""
+    if connection.vendor != 'sqlite':
+        return
+    pragmas = getattr(settings, 'SQLITE_PRAGMAS', {})
+    if connection.alias in getattr(settings, 'DATABASE_REPLICA_ALIASES', []):
+        pragmas = {name: value for name, value in pragmas.items() if name != 'journal_mode'}
+    if not pragmas:
+        return
+    with connection.cursor() as cursor:
+        for statement in pragma_statements(pragmas):
+            cursor.execute(statement)
@@ -0,0 +1,138 @@
+"""
+Outbound email queue.
+
+Views enqueue messages and return; a small pool of daemon threads sends
+them. Each sender keeps one backend connection open across messages and
+closes it after ``IDLE_TIMEOUT`` seconds without work. Failed sends are
+retried with exponential backoff and counted in metrics as ``mail.sent``,
+``mail.retried``, ``mail.failed`` and ``mail.dropped``.
+
+Configure with settings.MAIL_QUEUE; the backend is the usual
+EMAIL_BACKEND (console or file for local runs and tests, SMTP in
+production).
+"""
+import atexit
+import logging
+import queue
+import threading
+import time
+
+from django.conf import settings
+from django.core.mail import EmailMessage, get_connection
+
+from . import metrics
+
+
+logger = logging.getLogger(__name__)
+
+IDLE_TIMEOUT = 30
+
+
+def get_config():
+    config = {
+        'WORKERS': 2,
+        'MAX_RETRIES': 3,
+        'BACKOFF': 2.0,
+        'MAX_QUEUED': 1000,
+    }
+    config.update(getattr(settings, 'MAIL_QUEUE', {}))
+    return config
+
+
+class MailQueue:
+    """Bounded queue of EmailMessages drained by background sender threads"""
+
+    def __init__(self):
+        self._queue = None
+        self._workers = []
+        self._lock = threading.Lock()
+        atexit.register(self.drain)
+
+    def enqueue(self, message, attempt=0):
+        """Queue message for sending; returns False if the queue is full"""
+        self._start()
+        try:
+            self._queue.put_nowait((message, attempt))
+        except queue.Full:
+            metrics.incr('mail.dropped')
+            logger.error(f"Mail queue full, dropping email to {message.to}")
+            return False
+        return True
+
+    def drain(self, timeout=5.0):
+        """Wait up to timeout seconds for queued messages to be sent"""
+        if self._queue is None:
+            return
+        deadline = time.monotonic() + timeout
+        while self._queue.unfinished_tasks and time.monotonic() < deadline:
+            time.sleep(0.05)
+
+    def _start(self):
+        if self._workers:
+            return
+        with self._lock:
+            if self._workers:
+                return
+            config = get_config()
+            self.max_retries = config['MAX_RETRIES']
+            self.backoff = config['BACKOFF']
+            self._queue = queue.Queue(maxsize=config['MAX_QUEUED'])
+            for i in range(config['WORKERS']):
+                worker = threading.Thread(target=self._run, name=f'mail-sender-{i}', daemon=True)
+                worker.start()
+                self._workers.append(worker)
+
+    def _run(self):
+        connection = None
+        while True:
+            try:
+                message, attempt = self._queue.get(timeout=IDLE_TIMEOUT)
+            except queue.Empty:
+                if connection is not None:
+                    self._close(connection)
+                    connection = None
+                continue
+
+            try:
+                if connection is None:
+                    connection = get_connection(fail_silently=False)
+                    connection.open()
+                message.connection = connection
+                message.send()
+                metrics.incr('mail.sent')
+            except Exception as e:
+                # The connection may be broken; reopen for the next message
+                if connection is not None:
+                    self._close(connection)
+                    connection = None
+                self._retry(message, attempt, e)
+            finally:
+                self._queue.task_done()
+
+    def _retry(self, message, attempt, error):
+        if attempt >= self.max_retries:
+            metrics.incr('mail.failed')
+            logger.error(f"Giving up on email to {message.to} after {attempt + 1} attempts: {error}")
+            return
+        delay = self.backoff * 2 ** attempt
+        metrics.incr('mail.retried')
+        logger.warning(f"Email to {message.to} failed ({error}); retrying in {delay}s")
+        timer = threading.Timer(delay, self.enqueue, args=(message, attempt + 1))
+        timer.daemon = True
+        timer.start()
+
+    @staticmethod
+    def _close(connection):
+        try:
+            connection.close()
+        except Exception:
+            pass
+
+
+mail_queue = MailQueue()
+
+
+def queue_mail(subject, body, recipients, from_email=None):
+    """Build an EmailMessage and enqueue it"""
+    message = EmailMessage(subject, body, from_email or settings.DEFAULT_FROM_EMAIL, recipients)
+    return mail_queue.enqueue(message)
@@ -0,0 +1,159 @@
+"""
+Housekeeping jobs for tables that grow without bound.
+
+Every job works in small primary-key batches so each DELETE holds the
+SQLite writer lock only briefly, and stops as soon as peak hours begin.
+"""
+import time
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import transaction
+from django.db.models import Count, Max
+from django.utils import timezone
+
+from .models import Notification, Post
+
+
+DEFAULT_NOTIFICATION_RETENTION = {
+    'READ_DAYS': 90,            # Delete read notifications older than this
+    'COMPACT_AFTER_DAYS': 7,    # Collapse duplicate read notifications older than this
+    'BATCH_SIZE': 500,          # Rows deleted per transaction
+    'BATCH_PAUSE': 0.05,        # Seconds to sleep between batches
+    'PEAK_HOURS': (17, 23),     # Local hours [start, end) during which jobs refuse to run
+}
+
+
+def get_retention_policy(**overrides):
+    """Merge settings.NOTIFICATION_RETENTION and overrides onto the defaults"""
+    policy = dict(DEFAULT_NOTIFICATION_RETENTION)
+    policy.update(getattr(settings, 'NOTIFICATION_RETENTION', {}))
+    policy.update({key: value for key, value in overrides.items() if value is not None})
+    return policy
+
+
+def in_peak_hours(policy, now=None):
+    """Check whether the current local time falls inside the policy's peak window"""
+    peak = policy.get('PEAK_HOURS')
+    if not peak:
+        return False
+    start, end = peak
+    hour = timezone.localtime(now).hour
+    if start <= end:
+        return start <= hour < end
+    # Window wraps past midnight, e.g. (22, 2)
+    return hour >= start or hour < end
+
+
+class PeakHoursReached(Exception):
+    """Raised when a batch job runs into the configured peak window"""
+
+
+def _delete_in_batches(queryset, policy, force=False, dry_run=False):
+    """Delete rows matching queryset in short pk-ordered transactions"""
+    batch_size = policy['BATCH_SIZE']
+    pause = policy['BATCH_PAUSE']
+    model = queryset.model
+    deleted = 0
+    last_id = 0
+
+    while True:
+        if not force and in_peak_hours(policy):
+            raise PeakHoursReached(deleted)
+
+        ids = list(
+            queryset.filter(id__gt=last_id)
+            .order_by('id')
+            .values_list('id', flat=True)[:batch_size]
+        )
+        if not ids:
+            break
+        last_id = ids[-1]
+
+        if dry_run:
+            deleted += len(ids)
+            continue
+
+        with transaction.atomic():
+            count, _ = model.objects.filter(id__in=ids).delete()
+        deleted += count
+
+        if len(ids) < batch_size:
+            break
+        if pause:
+            time.sleep(pause)
+
+    return deleted
+
+
+def delete_orphaned_notifications(policy, force=False, dry_run=False):
+    """Delete notifications whose target post no longer exists"""
+    orphans = Notification.objects.filter(
+        target_type='post'
+    ).exclude(target_id__in=Post.objects.values('id'))
+    return _delete_in_batches(orphans, policy, force=force, dry_run=dry_run)
+
+
+def compact_read_notifications(policy, force=False, dry_run=False):
+    """Collapse repeated read notifications for the same actor and target.
+
+    Like/unlike/like cycles and re-follows leave one row per cycle; only the
+    newest of each (recipient, actor, verb, target) group is kept.
+    """
+    cutoff = timezone.now() - timedelta(days=policy['COMPACT_AFTER_DAYS'])
+    old_read = Notification.objects.filter(is_read=True, created_at__lt=cutoff)
+    groups = (
+        old_read.order_by()
+        .values('recipient_id', 'actor_id', 'verb', 'target_type', 'target_id')
+        .annotate(keep_id=Max('id'), total=Count('id'))
+        .filter(total__gt=1)
+    )
+
+    deleted = 0
+    for group in groups.iterator():
+        duplicates = old_read.filter(
+            recipient_id=group['recipient_id'],
+            actor_id=group['actor_id'],
+            verb=group['verb'],
+            target_type=group['target_type'],
+            target_id=group['target_id'],
+            id__lt=group['keep_id'],
+        )
+        deleted += _delete_in_batches(duplicates, policy, force=force, dry_run=dry_run)
+    return deleted
+
+
+def expire_read_notifications(policy, force=False, dry_run=False):
+    """Delete read notifications older than the retention window"""
+    cutoff = timezone.now() - timedelta(days=policy['READ_DAYS'])
+    expired = Notification.objects.filter(is_read=True, created_at__lt=cutoff)
+    return _delete_in_batches(expired, policy, force=force, dry_run=dry_run)
+
+
+NOTIFICATION_JOBS = (
+    ('orphaned', delete_orphaned_notifications),
+    ('compacted', compact_read_notifications),
+    ('expired', expire_read_notifications),
+)
+
+
+def run_notification_maintenance(policy=None, force=False, dry_run=False):
+    """Run every notification job in order and report rows reclaimed per job.
+
+    If peak hours begin mid-run, the current job stops after its last
+    committed batch and the remaining jobs are skipped.
+    """
+    policy = policy or get_retention_policy()
+    report = {name: 0 for name, _ in NOTIFICATION_JOBS}
+    report['interrupted'] = False
+
+    for name, job in NOTIFICATION_JOBS:
+        try:
+            report[name] = job(policy, force=force, dry_run=dry_run)
+        except PeakHoursReached as exc:
+            report[name] = exc.args[0]
+            report['interrupted'] = True
+            break
+
+    report['total'] = sum(report[name] for name, _ in NOTIFICATION_JOBS)
+    return report
@@ -0,0 +1,45 @@
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+from django.test.utils import setup_test_environment, teardown_test_environment
+
+from accounts import presence
+from accounts.benchmarks import load_scenarios
+from accounts.models import like_counter
+
+
+class Command(BaseCommand):
+    help = 'Run hot-path benchmarks against a throwaway test database'
+
+    def add_arguments(self, parser):
+        parser.add_argument('scenarios', nargs='*', help='Scenario names (default: all)')
+        parser.add_argument('--count', type=int, default=10000, help='Operations per scenario')
+        parser.add_argument('--processes', type=int, default=4, help='Worker processes for multi-process scenarios')
+        parser.add_argument('--list', action='store_true', help='List available scenarios')
+
+    def handle(self, *args, **options):
+        scenarios = load_scenarios()
+
+        if options['list']:
+            for name, func in sorted(scenarios.items()):
+                self.stdout.write(f"{name}: {(func.__doc__ or '').strip()}")
+            return
+
+        names = options['scenarios'] or sorted(scenarios)
+        unknown = [name for name in names if name not in scenarios]
+        if unknown:
+            raise CommandError(f"Unknown scenario(s): {', '.join(unknown)}")
+
+        setup_test_environment()
+        old_name = connection.settings_dict['NAME']
+        connection.creation.create_test_db(verbosity=0, autoclobber=True)
+        try:
+            for name in names:
+                results = scenarios[name](options)
+                summary = ', '.join(f'{key}={value}' for key, value in results.items())
+                self.stdout.write(self.style.SUCCESS(f'{name}: {summary}'))
+        finally:
+            # Write buffered counters while the test database still exists
+            like_counter.flush()
+            presence.last_seen.flush()
+            connection.creation.destroy_test_db(old_name, verbosity=0)
+            teardown_test_environment()
@@ -0,0 +1,61 @@
+from django.contrib.auth.models import User
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+from django.test.utils import setup_test_environment, teardown_test_environment
+
+from accounts.query_plans import HOT_QUERIES, explain, plan_problems
+
+
+class Command(BaseCommand):
+    help = 'EXPLAIN the hot view queries and fail on full table scans or temp B-tree sorts'
+
+    def add_arguments(self, parser):
+        parser.add_argument('queries', nargs='*', help='Query names (default: all)')
+        parser.add_argument('--live', action='store_true',
+                            help='Explain against the configured database instead of a throwaway test database')
+
+    def handle(self, *args, **options):
+        if connection.vendor != 'sqlite':
+            raise CommandError('Query plan checks are written against SQLite EXPLAIN QUERY PLAN output')
+
+        queries = HOT_QUERIES
+        if options['queries']:
+            known = {query.name for query in HOT_QUERIES}
+            unknown = [name for name in options['queries'] if name not in known]
+            if unknown:
+                raise CommandError(f"Unknown query name(s): {', '.join(unknown)}")
+            queries = [query for query in HOT_QUERIES if query.name in options['queries']]
+
+        if options['live']:
+            failures = self.check_plans(queries, options['verbosity'])
+        else:
+            setup_test_environment()
+            old_name = connection.settings_dict['NAME']
+            connection.creation.create_test_db(verbosity=0, autoclobber=True)
+            try:
+                failures = self.check_plans(queries, options['verbosity'])
+            finally:
+                connection.creation.destroy_test_db(old_name, verbosity=0)
+                teardown_test_environment()
+
+        if failures:
+            raise CommandError(f"Query plan regressions: {', '.join(failures)}")
+        self.stdout.write(self.style.SUCCESS(f'{len(queries)} hot queries use indexes'))
+
+    def check_plans(self, queries, verbosity):
+        user = User.objects.order_by('id').first() or User.objects.create_user(username='explain_hot_queries')
+        other_ids = list(User.objects.exclude(pk=user.pk).values_list('id', flat=True)[:3]) or [user.id + 1]
+
+        failures = []
+        for query in queries:
+            plan = explain(query.build(user, other_ids))
+            problems = plan_problems(plan, query.allow_sort)
+            if problems:
+                failures.append(query.name)
+                self.stdout.write(self.style.ERROR(f'{query.name}: {"; ".join(problems)}'))
+            elif verbosity > 1:
+                self.stdout.write(f'{query.name}: ok')
+            if problems or verbosity > 1:
+                for line in plan:
+                    self.stdout.write(f'    {line}')
+        return failures
@@ -0,0 +1,42 @@
+from django.core.management.base import BaseCommand, CommandError
+
+from accounts.maintenance import get_retention_policy, in_peak_hours, run_notification_maintenance
+
+
+class Command(BaseCommand):
+    help = 'Delete orphaned notifications and compact/expire old read ones in small batches'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--read-days', type=int, help='Retention for read notifications (days)')
+        parser.add_argument('--compact-after-days', type=int, help='Age after which duplicates are collapsed (days)')
+        parser.add_argument('--batch-size', type=int, help='Rows deleted per transaction')
+        parser.add_argument('--batch-pause', type=float, help='Seconds to sleep between batches')
+        parser.add_argument('--dry-run', action='store_true', help='Count rows without deleting them')
+        parser.add_argument('--force', action='store_true', help='Run even during configured peak hours')
+
+    def handle(self, *args, **options):
+        policy = get_retention_policy(
+            READ_DAYS=options['read_days'],
+            COMPACT_AFTER_DAYS=options['compact_after_days'],
+            BATCH_SIZE=options['batch_size'],
+            BATCH_PAUSE=options['batch_pause'],
+        )
+
+        if not options['force'] and in_peak_hours(policy):
+            raise CommandError(
+                f"Refusing to run during peak hours {policy['PEAK_HOURS']}; use --force to override"
+            )
+
+        report = run_notification_maintenance(
+            policy, force=options['force'], dry_run=options['dry_run']
+        )
+
+        verb = 'Would reclaim' if options['dry_run'] else 'Reclaimed'
+        self.stdout.write(
+            f"{verb} {report['total']} rows "
+            f"(orphaned={report['orphaned']}, compacted={report['compacted']}, expired={report['expired']})"
+        )
+        if report['interrupted']:
+            self.stdout.write(self.style.WARNING('Stopped early: peak hours started'))
+        else:
+            self.stdout.write(self.style.SUCCESS('Notification maintenance complete'))
@@ -0,0 +1,13 @@
+from django.core.management.base import BaseCommand
+
+from accounts.search import get_backend
+
+
+class Command(BaseCommand):
+    help = 'Create (if missing) and rebuild the full-text index over messages'
+
+    def handle(self, *args, **options):
+        backend = get_backend()
+        backend.install()
+        backend.rebuild()
+        self.stdout.write(self.style.SUCCESS(f'Rebuilt message index with {type(backend).__name__}'))
@@ -0,0 +1,36 @@
+from django.core.management.base import BaseCommand
+from django.db.models import Count, OuterRef, Subquery, Value
+from django.db.models.functions import Coalesce
+
+from accounts.models import Post, like_counter
+
+
+class Command(BaseCommand):
+    help = 'Flush buffered like counts and recompute Post.like_count from the likes table'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=1000, help='Posts updated per statement')
+
+    def handle(self, *args, **options):
+        like_counter.flush()
+
+        Like = Post.likes.through
+        actual = Like.objects.filter(post_id=OuterRef('pk')).order_by().values('post_id').annotate(
+            total=Count('id')
+        ).values('total')
+
+        batch_size = options['batch_size']
+        last_id = 0
+        updated = 0
+        while True:
+            ids = list(
+                Post.objects.filter(id__gt=last_id).order_by('id').values_list('id', flat=True)[:batch_size]
+            )
+            if not ids:
+                break
+            last_id = ids[-1]
+            updated += Post.objects.filter(id__in=ids).update(
+                like_count=Coalesce(Subquery(actual), Value(0))
+            )
+
+        self.stdout.write(self.style.SUCCESS(f'Recounted likes for {updated} posts'))
@@ -0,0 +1,73 @@
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from django.db.models import Exists, Max, OuterRef, Q
+
+from accounts.models import Conversation, ConversationReadState, Message
+
+
+class Command(BaseCommand):
+    help = 'Backfill last message fields, read states, direct keys and message seqs on conversations'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--all', action='store_true', help='Refresh every conversation, not only empty ones')
+
+    def handle(self, *args, **options):
+        conversations = Conversation.objects.all()
+        if not options['all']:
+            unnumbered = Message.objects.filter(conversation=OuterRef('pk'), seq__isnull=True)
+            conversations = conversations.filter(
+                Q(last_message__isnull=True) | Q(direct_key__isnull=True) | Exists(unnumbered)
+            )
+
+        refreshed = 0
+        for conversation in conversations.only('id').iterator():
+            conversation.refresh_last_message()
+            self.backfill_read_states(conversation)
+            self.backfill_direct_key(conversation)
+            self.backfill_seq(conversation)
+            refreshed += 1
+
+        self.stdout.write(self.style.SUCCESS(f'Refreshed {refreshed} conversations'))
+
+    def backfill_read_states(self, conversation):
+        """Seed missing read states from the legacy per-message is_read flags"""
+        existing = set(conversation.read_states.values_list('user_id', flat=True))
+        states = []
+        for user_id in conversation.participants.values_list('id', flat=True):
+            if user_id in existing:
+                continue
+            unread = conversation.messages.filter(is_read=False).exclude(sender_id=user_id)
+            last_read = conversation.messages.exclude(
+                id__in=unread.values('id')
+            ).order_by('-id').values_list('id', flat=True).first()
+            states.append(ConversationReadState(
+                conversation=conversation,
+                user_id=user_id,
+                last_read_message_id=last_read,
+                unread_count=unread.count()
+            ))
+        ConversationReadState.objects.bulk_create(states, ignore_conflicts=True)
+
+    def backfill_direct_key(self, conversation):
+        """Key 1:1 conversations; later duplicates of a pair are left unkeyed"""
+        participant_ids = list(conversation.participants.values_list('id', flat=True))
+        if len(participant_ids) != 2:
+            return
+        key = Conversation.direct_key_for(*participant_ids)
+        if not Conversation.objects.filter(direct_key=key).exists():
+            Conversation.objects.filter(pk=conversation.pk, direct_key__isnull=True).update(direct_key=key)
+
+    def backfill_seq(self, conversation):
+        """Number unsequenced messages in id order after the highest existing seq"""
+        with transaction.atomic():
+            messages = conversation.messages.filter(seq__isnull=True).order_by('id')
+            if not messages.exists():
+                return
+            seq = conversation.messages.aggregate(top=Max('seq'))['top'] or 0
+            numbered = []
+            for message in messages.only('id'):
+                seq += 1
+                message.seq = seq
+                numbered.append(message)
+            Message.objects.bulk_update(numbered, ['seq'], batch_size=500)
+            Conversation.objects.filter(pk=conversation.pk).update(last_seq=seq)
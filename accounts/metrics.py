@@ -0,0 +1,28 @@
+"""
+In-process event counters exposed at ``/api/metrics/`` for staff users.
+
+Counters are per process; scrape every worker or aggregate downstream.
+"""
+import threading
+from collections import Counter
+
+
+_counters = Counter()
+_lock = threading.Lock()
+
+
+def incr(name, amount=1):
+    """Add amount to the counter called name"""
+    with _lock:
+        _counters[name] += amount
+
+
+def snapshot(prefix=''):
+    """Copy of all counters whose name starts with prefix"""
+    with _lock:
+        return {name: value for name, value in _counters.items() if name.startswith(prefix)}
+
+
+def reset():
+    with _lock:
+        _counters.clear()
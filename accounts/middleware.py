@@ -1,8 +1,12 @@
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction
 from channels.db import database_sync_to_async
 from django.contrib.auth.models import AnonymousUser, User
 from rest_framework_simplejwt.tokens import AccessToken
 from rest_framework_simplejwt.exceptions import InvalidToken, TokenError
 from urllib.parse import parse_qs
+from . import metrics
+from .cache import get_token_user, set_token_user
+from .routers import begin_request, end_request, pin_current_request, view_wants_primary
 
 
 class JWTAuthMiddleware:
@@ -24,10 +28,12 @@ class JWTAuthMiddleware:
         
         return await self.app(scope, receive, send)
 
-    @database_sync_to_async
-    def get_user_from_token(self, token):
+    async def get_user_from_token(self, token):
         """
         Validate JWT token and return the user.
+        
+        Signature and expiry are checked on every handshake (CPU only); the
+        user lookup is served from the per-jti cache when possible.
         """
         if not token:
             return AnonymousUser()
@@ -35,10 +41,62 @@ class JWTAuthMiddleware:
         try:
             # Decode the token
             access_token = AccessToken(token)
-            user_id = access_token['user_id']
-            
-            # Get the user
-            user = User.objects.get(id=user_id)
+        except (InvalidToken, TokenError):
+            return AnonymousUser()
+
+        jti = access_token.get('jti')
+        user = get_token_user(jti) if jti else None
+        if user is not None:
+            metrics.incr('ws_auth.cache_hit')
             return user
-        except (InvalidToken, TokenError, User.DoesNotExist):
+
+        metrics.incr('ws_auth.cache_miss')
+        return await self.load_user(access_token)
+
+    @database_sync_to_async
+    def load_user(self, access_token):
+        try:
+            user = User.objects.select_related('profile').get(id=access_token['user_id'])
+        except User.DoesNotExist:
             return AnonymousUser()
+        if not user.is_active:
+            return AnonymousUser()
+        if access_token.get('jti'):
+            set_token_user(access_token['jti'], user, access_token['exp'])
+        return user
+
+
+class ReplicaRoutingMiddleware:
+    """
+    Scope database routing (see routers.py) to each HTTP request.
+    
+    Must come after SessionMiddleware. Works for sync and async views.
+    """
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        if iscoroutinefunction(get_response):
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if iscoroutinefunction(self):
+            return self.__acall__(request)
+        token = begin_request(request)
+        try:
+            return self.get_response(request)
+        finally:
+            end_request(request, token)
+
+    async def __acall__(self, request):
+        token = begin_request(request)
+        try:
+            return await self.get_response(request)
+        finally:
+            end_request(request, token)
+
+    def process_view(self, request, view_func, view_args, view_kwargs):
+        if view_wants_primary(view_func):
+            pin_current_request()
+        return None
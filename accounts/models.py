@@ -1,9 +1,12 @@
-from django.db import models
+from django.db import models, transaction
 from django.contrib.auth.models import User
-from django.db.models.signals import post_save, m2m_changed
+from django.db.models.signals import post_save, post_delete, m2m_changed
 from django.dispatch import receiver
+from django.core.cache import cache
 from django.utils import timezone
 from datetime import timedelta
+from .cache import invalidate_user
+from .counters import BufferedCounter
 
 
 class Profile(models.Model):
@@ -12,6 +15,7 @@ class Profile(models.Model):
     bio = models.TextField(max_length=500, blank=True)
     website = models.URLField(max_length=200, blank=True)
     following = models.ManyToManyField('self', symmetrical=False, related_name='followers', blank=True)
+    last_seen = models.DateTimeField(null=True, blank=True)
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
     
@@ -43,6 +47,19 @@ def save_user_profile(sender, instance, **kwargs):
         instance.profile.save()
 
 
+@receiver(post_save, sender=User)
+@receiver(post_delete, sender=User)
+def invalidate_cached_user(sender, instance, **kwargs):
+    """Drop cached users so deactivation and edits apply on the next request or handshake"""
+    invalidate_user(instance.pk)
+
+
+@receiver(post_save, sender=Profile)
+@receiver(post_delete, sender=Profile)
+def invalidate_cached_profile(sender, instance, **kwargs):
+    invalidate_user(instance.user_id)
+
+
 class Notification(models.Model):
     NOTIFICATION_TYPES = (
         ('like', 'Like'),
@@ -60,6 +77,12 @@ class Notification(models.Model):
     
     class Meta:
         ordering = ['-created_at']
+        indexes = [
+            models.Index(fields=['target_type', 'target_id']),
+            models.Index(fields=['is_read', 'created_at']),
+            # Notification list newest first; also bounds mark-all-read
+            models.Index(fields=['recipient', '-created_at']),
+        ]
     
     def __str__(self):
         return f"{self.actor.username} {self.verb} - {self.recipient.username}"
@@ -67,6 +90,16 @@ class Notification(models.Model):
 
 class Conversation(models.Model):
     participants = models.ManyToManyField(User, related_name='conversations')
+    # "<lower user id>:<higher user id>" for 1:1 threads; unique, so lookup is one index probe
+    direct_key = models.CharField(max_length=41, unique=True, null=True, blank=True)
+    # Denormalized from the newest message so the inbox needs no per-row lookups
+    last_message = models.ForeignKey(
+        'Message', on_delete=models.SET_NULL, null=True, blank=True, related_name='+'
+    )
+    last_message_preview = models.CharField(max_length=100, blank=True)
+    last_message_at = models.DateTimeField(null=True, blank=True)
+    # Sequence number of the newest message; see Message.seq
+    last_seq = models.PositiveBigIntegerField(default=0)
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
     
@@ -76,9 +109,41 @@ class Conversation(models.Model):
     def __str__(self):
         return f"Conversation {self.id}"
     
-    @property
-    def last_message(self):
-        return self.messages.first()
+    @staticmethod
+    def direct_key_for(user_id, other_user_id):
+        """Canonical key of the 1:1 conversation between two users"""
+        low, high = sorted((user_id, other_user_id))
+        return f"{low}:{high}"
+    
+    @classmethod
+    def get_or_create_direct(cls, user, other_user):
+        """Find or create the 1:1 conversation started by user with other_user.
+        
+        The unique direct_key makes concurrent creates collapse onto one row.
+        Participants, and the message request when other_user doesn't follow
+        user, are added in the same transaction as the insert, so a new
+        thread never shows in the recipient's primary inbox first.
+        """
+        key = cls.direct_key_for(user.id, other_user.id)
+        with transaction.atomic():
+            conversation, created = cls.objects.get_or_create(direct_key=key)
+            if created:
+                conversation.participants.add(user, other_user)
+                if not Profile.following.through.objects.filter(
+                    from_profile__user_id=other_user.id,
+                    to_profile__user_id=user.id
+                ).exists():
+                    MessageRequest.objects.create(conversation=conversation, recipient=other_user)
+        return conversation, created
+    
+    def refresh_last_message(self):
+        """Recompute the denormalized last message fields from the messages table"""
+        message = self.messages.order_by('-created_at', '-id').first()
+        Conversation.objects.filter(pk=self.pk).update(
+            last_message=message,
+            last_message_preview=message.text[:100] if message else '',
+            last_message_at=message.created_at if message else None
+        )
     
     def get_other_participant(self, user):
         """Get the other participant in the conversation"""
@@ -86,36 +151,143 @@ class Conversation(models.Model):
     
     def has_unread_messages(self, user):
         """Check if conversation has unread messages for the user"""
-        return self.messages.filter(is_read=False).exclude(sender=user).exists()
+        return self.unread_count(user) > 0
     
     def unread_count(self, user):
         """Get count of unread messages for the user"""
-        return self.messages.filter(is_read=False).exclude(sender=user).count()
+        state = self.read_states.filter(user=user).only('unread_count').first()
+        return state.unread_count if state else 0
 
 
 class Message(models.Model):
     conversation = models.ForeignKey(Conversation, on_delete=models.CASCADE, related_name='messages')
     sender = models.ForeignKey(User, on_delete=models.CASCADE, related_name='sent_messages')
     text = models.TextField()
+    # Legacy flag, no longer written: read state lives in ConversationReadState.
+    # Only refresh_conversations reads it, to seed missing read states.
     is_read = models.BooleanField(default=False)
+    # Increasing per-conversation position, so reconnecting clients can ask
+    # for exactly the messages after the last one they saw. Numbers are
+    # assigned without gaps, but deleting a message leaves one.
+    seq = models.PositiveBigIntegerField(null=True, blank=True)
     created_at = models.DateTimeField(auto_now_add=True)
     
     class Meta:
         ordering = ['-created_at']
+        indexes = [
+            # Keyset pagination seeks on (conversation, created_at, id); also
+            # serves (conversation, -created_at) scanned backwards
+            models.Index(fields=['conversation', 'created_at', 'id']),
+        ]
+        constraints = [
+            models.UniqueConstraint(fields=['conversation', 'seq'], name='unique_message_seq'),
+        ]
     
     def __str__(self):
         return f"{self.sender.username}: {self.text[:30]}"
+    
+    def save(self, *args, **kwargs):
+        if self._state.adding and self.seq is None:
+            with transaction.atomic():
+                # The UPDATE locks the conversation row until commit, so
+                # concurrent senders get consecutive numbers
+                Conversation.objects.filter(pk=self.conversation_id).update(
+                    last_seq=models.F('last_seq') + 1
+                )
+                self.seq = Conversation.objects.filter(
+                    pk=self.conversation_id
+                ).values_list('last_seq', flat=True).get()
+                super().save(*args, **kwargs)
+            return
+        super().save(*args, **kwargs)
+
+
+class ConversationReadState(models.Model):
+    """Read watermark and unread counter of one participant in a conversation.
+
+    Sending a message bumps the counters of the other participants; reading
+    moves the watermark to the conversation's last message and resets the
+    counter, so neither needs per-message updates.
+    """
+    conversation = models.ForeignKey(Conversation, on_delete=models.CASCADE, related_name='read_states')
+    user = models.ForeignKey(User, on_delete=models.CASCADE, related_name='conversation_read_states')
+    last_read_message_id = models.BigIntegerField(null=True, blank=True)
+    unread_count = models.PositiveIntegerField(default=0)
+    updated_at = models.DateTimeField(auto_now=True)
+    
+    class Meta:
+        unique_together = ('conversation', 'user')
+    
+    def __str__(self):
+        return f"{self.user.username} in {self.conversation_id}: {self.unread_count} unread"
+    
+    @classmethod
+    def mark_read(cls, conversation_id, user):
+        """Move user's watermark to the last message; no-op if nothing is unread"""
+        return cls.objects.filter(
+            conversation_id=conversation_id, user=user, unread_count__gt=0
+        ).update(
+            last_read_message_id=models.Subquery(
+                Conversation.objects.filter(pk=models.OuterRef('conversation_id')).values('last_message_id')[:1]
+            ),
+            unread_count=0,
+            updated_at=timezone.now()
+        )
+    
+    @classmethod
+    def watermarks(cls, conversation_ids):
+        """Map of conversation id to {participant id: last read message id}"""
+        watermarks = {conversation_id: {} for conversation_id in conversation_ids}
+        rows = cls.objects.filter(conversation_id__in=watermarks).values_list(
+            'conversation_id', 'user_id', 'last_read_message_id'
+        )
+        for conversation_id, user_id, last_read in rows:
+            watermarks[conversation_id][user_id] = last_read
+        return watermarks
+    
+    @staticmethod
+    def read_by_others(watermarks, message_id, sender_id):
+        """Whether any participant but the sender has read up to message_id"""
+        return any(
+            last_read is not None and last_read >= message_id
+            for user_id, last_read in watermarks.items()
+            if user_id != sender_id
+        )
 
 
 class UserNote(models.Model):
     """User's personal note that appears at the top of messages"""
+    LIFETIME = timedelta(hours=24)
+    
     user = models.OneToOneField(User, on_delete=models.CASCADE, related_name='note')
     text = models.CharField(max_length=60, blank=True)
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
     
+    class Meta:
+        indexes = [
+            models.Index(fields=['updated_at']),
+        ]
+    
     def __str__(self):
         return f"{self.user.username}'s note: {self.text[:30]}"
+    
+    @property
+    def expires_at(self):
+        return self.updated_at + self.LIFETIME
+    
+    @staticmethod
+    def tray_cache_key(viewer_id):
+        return f'notes_tray:{viewer_id}'
+    
+    @classmethod
+    def invalidate_trays(cls, user_id):
+        """Drop the cached tray of user_id and of everyone following them"""
+        viewer_ids = list(
+            Profile.objects.filter(following__user_id=user_id).values_list('user_id', flat=True)
+        )
+        viewer_ids.append(user_id)
+        cache.delete_many([cls.tray_cache_key(viewer_id) for viewer_id in viewer_ids])
 
 
 class MessageRequest(models.Model):
@@ -128,6 +300,9 @@ class MessageRequest(models.Model):
     
     class Meta:
         ordering = ['-created_at']
+        indexes = [
+            models.Index(fields=['recipient', 'is_accepted', 'is_declined']),
+        ]
     
     def __str__(self):
         return f"Request to {self.recipient.username}"
@@ -140,24 +315,38 @@ class Post(models.Model):
     video = models.FileField(upload_to='posts/', blank=True, null=True)
     caption = models.TextField(max_length=2200, blank=True)
     likes = models.ManyToManyField(User, related_name='liked_posts', blank=True)
+    like_count = models.IntegerField(default=0)
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
     
     class Meta:
         ordering = ['-created_at']
+        indexes = [
+            # Explore (all posts, newest first) and per-author profile grids
+            models.Index(fields=['-created_at']),
+            models.Index(fields=['author', '-created_at']),
+        ]
     
     def __str__(self):
         return f"{self.author.username} - {self.created_at.strftime('%Y-%m-%d %H:%M')}"
     
     @property
     def likes_count(self):
-        return self.likes.count()
+        return self.like_count + like_counter.pending(self.pk)
+    
+    def is_liked_by(self, user):
+        """Check a single like via the through table's (post, user) unique index"""
+        return Post.likes.through.objects.filter(post_id=self.pk, user_id=user.pk).exists()
     
     @property
     def comments_count(self):
         return self.comments.count()
 
 
+# Like counts are buffered in memory and flushed periodically (see counters.py)
+like_counter = BufferedCounter(Post, 'like_count')
+
+
 class Comment(models.Model):
     post = models.ForeignKey(Post, on_delete=models.CASCADE, related_name='comments')
     author = models.ForeignKey(User, on_delete=models.CASCADE, related_name='comments')
@@ -166,6 +355,10 @@ class Comment(models.Model):
     
     class Meta:
         ordering = ['created_at']
+        indexes = [
+            # A post's comments in display order
+            models.Index(fields=['post', 'created_at']),
+        ]
     
     def __str__(self):
         return f"{self.author.username} on {self.post.id}: {self.text[:30]}"
@@ -181,6 +374,10 @@ class Story(models.Model):
     class Meta:
         ordering = ['-created_at']
         verbose_name_plural = 'Stories'
+        indexes = [
+            # Active stories of a set of users
+            models.Index(fields=['user', 'expires_at']),
+        ]
     
     def save(self, *args, **kwargs):
         if not self.expires_at:
@@ -215,6 +412,9 @@ class SavedPost(models.Model):
     class Meta:
         unique_together = ('user', 'post')
         ordering = ['-saved_at']
+        indexes = [
+            models.Index(fields=['user', '-saved_at']),
+        ]
     
     def __str__(self):
         return f"{self.user.username} saved {self.post.id}"
@@ -222,20 +422,80 @@ class SavedPost(models.Model):
 
 # Signal handlers for posts (merged from posts/signals.py)
 @receiver(m2m_changed, sender=Post.likes.through)
-def create_like_notification(sender, instance, action, pk_set, **kwargs):
-    """Create notification when someone likes a post"""
-    if action == 'post_add':
-        for user_id in pk_set:
-            from django.contrib.auth.models import User
-            liker = User.objects.get(pk=user_id)
-            if liker != instance.author:
-                Notification.objects.create(
-                    recipient=instance.author,
-                    actor=liker,
-                    verb='like',
-                    target_type='post',
-                    target_id=instance.id
-                )
+def create_like_notification(sender, instance, action, pk_set, reverse, **kwargs):
+    """Create notifications when posts are liked, in one INSERT per batch.
+
+    pk_set only holds the newly added ids, so bulk ``likes.add(*users)``
+    calls cost a single bulk_create instead of two queries per liker.
+    """
+    if action != 'post_add' or not pk_set:
+        return
+    
+    if reverse:
+        # user.liked_posts.add(*posts): instance is the liker, pk_set are posts
+        authors = Post.objects.filter(pk__in=pk_set).exclude(
+            author_id=instance.pk
+        ).values_list('id', 'author_id')
+        notifications = [
+            Notification(
+                recipient_id=author_id,
+                actor_id=instance.pk,
+                verb='like',
+                target_type='post',
+                target_id=post_id
+            )
+            for post_id, author_id in authors
+        ]
+    else:
+        notifications = [
+            Notification(
+                recipient_id=instance.author_id,
+                actor_id=user_id,
+                verb='like',
+                target_type='post',
+                target_id=instance.id
+            )
+            for user_id in pk_set
+            if user_id != instance.author_id
+        ]
+    
+    Notification.objects.bulk_create(notifications, batch_size=500)
+
+
+@receiver(m2m_changed, sender=Post.likes.through)
+def update_like_count(sender, instance, action, pk_set, reverse, **kwargs):
+    """Keep Post.like_count in step with the likes through table"""
+    Like = Post.likes.through
+    
+    if action in ('pre_remove', 'pre_clear'):
+        # remove() reports every requested id, clear() reports none, so look
+        # up which rows will actually go before they are deleted.
+        if reverse:
+            rows = Like.objects.filter(user_id=instance.pk)
+            if pk_set is not None:
+                rows = rows.filter(post_id__in=pk_set)
+            instance._removed_like_post_ids = list(rows.values_list('post_id', flat=True))
+        else:
+            rows = Like.objects.filter(post_id=instance.pk)
+            if pk_set is not None:
+                rows = rows.filter(user_id__in=pk_set)
+            instance._removed_like_count = rows.count()
+        return
+    
+    if action == 'post_add' and pk_set:
+        if reverse:
+            for post_id in pk_set:
+                like_counter.add_on_commit(post_id, 1)
+        else:
+            like_counter.add_on_commit(instance.pk, len(pk_set))
+    elif action in ('post_remove', 'post_clear'):
+        if reverse:
+            for post_id in getattr(instance, '_removed_like_post_ids', ()):
+                like_counter.add_on_commit(post_id, -1)
+            instance._removed_like_post_ids = ()
+        else:
+            like_counter.add_on_commit(instance.pk, -getattr(instance, '_removed_like_count', 0))
+            instance._removed_like_count = 0
 
 
 @receiver(post_save, sender=Comment)
@@ -249,3 +509,79 @@ def create_comment_notification(sender, instance, created, **kwargs):
             target_type='post',
             target_id=instance.post.id
         )
+
+
+@receiver(post_save, sender=Message)
+def update_conversation_last_message(sender, instance, created, **kwargs):
+    """Store the new message on its conversation and bump unread counters"""
+    if created:
+        Conversation.objects.filter(pk=instance.conversation_id).update(
+            last_message=instance,
+            last_message_preview=instance.text[:100],
+            last_message_at=instance.created_at,
+            updated_at=instance.created_at
+        )
+        states = ConversationReadState.objects.filter(conversation_id=instance.conversation_id)
+        states.exclude(user_id=instance.sender_id).update(
+            unread_count=models.F('unread_count') + 1
+        )
+        # The sender has implicitly read everything up to their own message
+        states.filter(user_id=instance.sender_id).update(
+            last_read_message_id=instance.id,
+            unread_count=0
+        )
+
+
+@receiver(m2m_changed, sender=Conversation.participants.through)
+def create_read_states(sender, instance, action, pk_set, reverse, **kwargs):
+    """Give every new participant a read state row"""
+    if action != 'post_add' or not pk_set:
+        return
+    if reverse:
+        states = [ConversationReadState(conversation_id=pk, user_id=instance.pk) for pk in pk_set]
+    else:
+        states = [ConversationReadState(conversation_id=instance.pk, user_id=pk) for pk in pk_set]
+    ConversationReadState.objects.bulk_create(states, ignore_conflicts=True)
+
+
+@receiver(post_delete, sender=Message)
+def clear_conversation_last_message(sender, instance, **kwargs):
+    """Fall back to the previous message when the latest one is deleted"""
+    conversation = Conversation.objects.filter(
+        pk=instance.conversation_id, last_message__isnull=True
+    ).exclude(last_message_at__isnull=True).first()
+    if conversation:
+        conversation.refresh_last_message()
+
+
+@receiver(post_save, sender=UserNote)
+@receiver(post_delete, sender=UserNote)
+def invalidate_note_trays(sender, instance, **kwargs):
+    """A changed note must show up in every follower's tray"""
+    UserNote.invalidate_trays(instance.user_id)
+
+
+@receiver(m2m_changed, sender=Profile.following.through)
+def invalidate_follower_tray(sender, instance, action, pk_set, reverse, **kwargs):
+    """Following or unfollowing changes whose notes a viewer sees"""
+    if action == 'pre_clear' and reverse:
+        # clear() reports no pk_set, so note the followers before they go
+        instance._cleared_follower_ids = list(instance.followers.values_list('pk', flat=True))
+        return
+    if action not in ('post_add', 'post_remove', 'post_clear'):
+        return
+    if reverse:
+        # instance was (un)followed by the profiles in pk_set
+        if action == 'post_clear':
+            pk_set = getattr(instance, '_cleared_follower_ids', ())
+            instance._cleared_follower_ids = ()
+        viewer_ids = Profile.objects.filter(pk__in=pk_set or ()).values_list('user_id', flat=True)
+    else:
+        viewer_ids = [instance.user_id]
+    cache.delete_many([UserNote.tray_cache_key(viewer_id) for viewer_id in viewer_ids])
+
+
+@receiver(post_delete, sender=Post)
+def delete_post_notifications(sender, instance, **kwargs):
+    """Remove like/comment notifications that point at a deleted post"""
+    Notification.objects.filter(target_type='post', target_id=instance.id).delete()
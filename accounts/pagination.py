@@ -0,0 +1,88 @@
+from django.db.models import Q
+from rest_framework.exceptions import NotFound
+from rest_framework.pagination import BasePagination, CursorPagination
+from rest_framework.response import Response
+from rest_framework.utils.urls import remove_query_param, replace_query_param
+
+
+class InboxCursorPagination(CursorPagination):
+    """Keyset pagination over the inbox, newest activity first"""
+    page_size = 20
+    max_page_size = 50
+    page_size_query_param = 'page_size'
+    ordering = ('-updated_at', '-id')
+
+
+class MessageKeysetPagination(BasePagination):
+    """Keyset pagination over a conversation's messages.
+
+    ``?before_id=<id>`` returns the page of messages older than the anchor,
+    ``?after_id=<id>`` the messages newer than it (the gap a reconnecting
+    client missed). Without an anchor the newest page is returned. Pages are
+    always newest first and seek on the (conversation, created_at, id) index,
+    so every page costs the same however deep the history is.
+    """
+    page_size = 30
+    max_page_size = 100
+    page_size_query_param = 'page_size'
+
+    def get_page_size(self, request):
+        try:
+            size = int(request.query_params.get(self.page_size_query_param, self.page_size))
+        except (TypeError, ValueError):
+            return self.page_size
+        return max(1, min(size, self.max_page_size))
+
+    def _anchor(self, queryset, param):
+        try:
+            anchor_id = int(self.request.query_params[param])
+        except (KeyError, TypeError, ValueError):
+            return None
+        created_at = queryset.filter(pk=anchor_id).values_list('created_at', flat=True).first()
+        if created_at is None:
+            raise NotFound(f'Unknown {param}')
+        return created_at, anchor_id
+
+    def paginate_queryset(self, queryset, request, view=None):
+        self.request = request
+        size = self.get_page_size(request)
+        before = self._anchor(queryset, 'before_id')
+        after = None if before else self._anchor(queryset, 'after_id')
+
+        if after:
+            created_at, anchor_id = after
+            page = list(
+                queryset.filter(
+                    Q(created_at__gt=created_at) | Q(created_at=created_at, id__gt=anchor_id)
+                ).order_by('created_at', 'id')[:size + 1]
+            )
+            self.has_more = len(page) > size
+            page = page[:size][::-1]
+            # There is always older history before an after_id anchor
+            self.has_older = True
+        else:
+            if before:
+                created_at, anchor_id = before
+                queryset = queryset.filter(
+                    Q(created_at__lt=created_at) | Q(created_at=created_at, id__lt=anchor_id)
+                )
+            page = list(queryset.order_by('-created_at', '-id')[:size + 1])
+            self.has_older = len(page) > size
+            page = page[:size]
+            self.has_more = bool(before)
+
+        self.page = page
+        return page
+
+    def get_paginated_response(self, data):
+        url = self.request.build_absolute_uri()
+        older = newer = None
+        if self.page and self.has_older:
+            older = remove_query_param(replace_query_param(url, 'before_id', self.page[-1].id), 'after_id')
+        if self.page and self.has_more:
+            newer = remove_query_param(replace_query_param(url, 'after_id', self.page[0].id), 'before_id')
+        return Response({
+            'next': older,
+            'previous': newer,
+            'results': data,
+        })
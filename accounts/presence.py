@@ -0,0 +1,123 @@
+"""
+Online presence and last-seen tracking for messaging.
+
+Online state lives only in the cache: each user has a connection counter
+key that expires unless a socket heartbeats, so crashed workers cannot
+leave users online forever. Each process also counts its own open sockets
+per user, which restores the counter if it expired while sockets were
+still open. Last-seen timestamps are buffered in process
+memory and written to Profile.last_seen in one UPDATE per flush interval
+rather than on every connect, disconnect and heartbeat.
+"""
+import atexit
+import threading
+import time
+from collections import Counter
+
+from django.core.cache import cache
+from django.db.models import Case, DateTimeField, Value, When
+from django.utils import timezone
+
+
+PRESENCE_TTL = 60                # Seconds a connection counter survives without a heartbeat
+HEARTBEAT_MIN_INTERVAL = 20      # Heartbeats closer together than this are not written
+LAST_SEEN_FLUSH_INTERVAL = 30    # Seconds between last-seen database writes
+
+
+# user id -> sockets open in this process
+local_sockets = Counter()
+
+
+def presence_key(user_id):
+    return f'presence:{user_id}'
+
+
+async def connected(user_id):
+    """Count a new socket for user_id"""
+    key = presence_key(user_id)
+    local_sockets[user_id] += 1
+    # A missing counter starts from this process's sockets, not from 1
+    if not await cache.aadd(key, local_sockets[user_id], PRESENCE_TTL):
+        try:
+            await cache.aincr(key)
+        except ValueError:
+            # Expired between add and incr
+            await cache.aset(key, local_sockets[user_id], PRESENCE_TTL)
+        await cache.atouch(key, PRESENCE_TTL)
+    last_seen.record(user_id)
+
+
+async def disconnected(user_id):
+    """Drop one socket for user_id; the user goes offline at zero"""
+    key = presence_key(user_id)
+    local_sockets[user_id] -= 1
+    if local_sockets[user_id] <= 0:
+        del local_sockets[user_id]
+    try:
+        remaining = await cache.adecr(key)
+    except ValueError:
+        remaining = 0
+    if remaining <= 0:
+        await cache.adelete(key)
+    last_seen.record(user_id)
+
+
+async def heartbeat(user_id):
+    """Keep user_id's online mark alive, restoring it if it expired"""
+    key = presence_key(user_id)
+    if not await cache.atouch(key, PRESENCE_TTL):
+        await cache.aadd(key, max(local_sockets[user_id], 1), PRESENCE_TTL)
+    last_seen.record(user_id)
+
+
+def online_user_ids(user_ids):
+    """Subset of user_ids with at least one live socket, in one cache round trip"""
+    keys = {presence_key(user_id): user_id for user_id in user_ids}
+    found = cache.get_many(list(keys))
+    return {keys[key] for key, count in found.items() if count and count > 0}
+
+
+class LastSeenBuffer:
+    """Latest activity time per user, flushed to Profile.last_seen in batches"""
+
+    def __init__(self, flush_interval=LAST_SEEN_FLUSH_INTERVAL):
+        self.flush_interval = flush_interval
+        self._pending = {}
+        self._lock = threading.Lock()
+        self._flushed_at = time.monotonic()
+        atexit.register(self.flush)
+
+    def record(self, user_id):
+        with self._lock:
+            self._pending[user_id] = timezone.now()
+
+    def pending(self, user_id):
+        return self._pending.get(user_id)
+
+    def is_due(self):
+        return bool(self._pending) and time.monotonic() - self._flushed_at >= self.flush_interval
+
+    def flush(self):
+        """Write pending timestamps with one UPDATE ... CASE per 250 users"""
+        from .models import Profile
+
+        with self._lock:
+            pending, self._pending = self._pending, {}
+            self._flushed_at = time.monotonic()
+        if not pending:
+            return 0
+
+        items = list(pending.items())
+        updated = 0
+        for start in range(0, len(items), 250):
+            batch = dict(items[start:start + 250])
+            updated += Profile.objects.filter(user_id__in=batch).update(
+                last_seen=Case(
+                    *[When(user_id=user_id, then=Value(seen)) for user_id, seen in batch.items()],
+                    output_field=DateTimeField()
+                )
+            )
+        return updated
+
+
+last_seen = LastSeenBuffer()
@@ -0,0 +1,110 @@
+"""
+Query-plan checks for the hot read paths.
+
+Each entry in HOT_QUERIES builds the queryset a view runs. ``explain``
+returns SQLite's EXPLAIN QUERY PLAN for it, and ``plan_problems`` flags
+the two regressions the composite indexes on the models exist to
+prevent: a full table scan (``SCAN <table>`` without an index) and a
+sort through a temporary B-tree. Queries that merge several index ranges
+(``author IN (...)``, a user's conversations) must sort the merged rows
+no matter which index is used, so they are registered with
+``allow_sort``; their result sets are bounded by the filter.
+
+Run with ``python manage.py explain_hot_queries``; accounts/tests runs
+it against seeded data.
+"""
+import re
+from collections import namedtuple
+
+from django.db import connections
+from django.utils import timezone
+
+from .models import Comment, Message, Notification, Post, SavedPost, Story
+
+
+HotQuery = namedtuple('HotQuery', 'name build allow_sort')
+
+HOT_QUERIES = []
+
+# Older SQLite versions print 'SCAN TABLE <table>'
+FULL_SCAN = re.compile(r'^SCAN (TABLE )?\S+$')
+TEMP_SORT = 'USE TEMP B-TREE'
+
+
+def hot_query(name, allow_sort=False):
+    """Register a function (user, other_ids) -> queryset under name"""
+    def decorator(build):
+        HOT_QUERIES.append(HotQuery(name, build, allow_sort))
+        return build
+    return decorator
+
+
+@hot_query('user_posts')
+def user_posts(user, other_ids):
+    return Post.objects.filter(author=user).order_by('-created_at')[:12]
+
+
+@hot_query('feed', allow_sort=True)
+def feed(user, other_ids):
+    from .views import with_like_state
+    return with_like_state(Post.objects.filter(author_id__in=other_ids).order_by('-created_at'), user)[:10]
+
+
+@hot_query('explore')
+def explore(user, other_ids):
+    from .views import with_like_state
+    return with_like_state(Post.objects.order_by('-created_at'), user)[:20]
+
+
+@hot_query('notifications')
+def notifications(user, other_ids):
+    return Notification.objects.filter(recipient=user)[:10]
+
+
+@hot_query('mark_notifications_read')
+def mark_notifications_read(user, other_ids):
+    return Notification.objects.filter(recipient=user, is_read=False).order_by()
+
+
+@hot_query('messages')
+def messages(user, other_ids):
+    return Message.objects.filter(conversation_id=1).order_by('-created_at', '-id')[:50]
+
+
+@hot_query('stories', allow_sort=True)
+def stories(user, other_ids):
+    return Story.objects.filter(
+        user_id__in=[user.id, *other_ids], expires_at__gt=timezone.now()
+    ).order_by('-created_at')
+
+
+@hot_query('saved_posts')
+def saved_posts(user, other_ids):
+    return SavedPost.objects.filter(user=user).order_by('-saved_at')[:12]
+
+
+@hot_query('post_comments')
+def post_comments(user, other_ids):
+    return Comment.objects.filter(post_id=1)
+
+
+@hot_query('inbox', allow_sort=True)
+def inbox(user, other_ids):
+    from .views import inbox_queryset
+    return inbox_queryset(user).order_by('-updated_at', '-id')[:21]
+
+
+def explain(queryset, using='default'):
+    """Detail lines of SQLite's EXPLAIN QUERY PLAN for queryset"""
+    sql, params = queryset.query.sql_with_params()
+    with connections[using].cursor() as cursor:
+        cursor.execute(f'EXPLAIN QUERY PLAN {sql}', params)
+        return [row[-1] for row in cursor.fetchall()]
+
+
+def plan_problems(plan, allow_sort=False):
+    """Plan lines showing a full table scan, or a temp B-tree sort unless allowed"""
+    problems = [line for line in plan if FULL_SCAN.match(line.strip())]
+    if not allow_sort:
+        problems += [line for line in plan if TEMP_SORT in line]
+    return problems
@@ -0,0 +1,69 @@
+"""
+Replay of recently missed chat messages for reconnecting sockets.
+
+Each conversation keeps its last REPLAY_BUFFER_SIZE broadcast payloads in
+the cache. A client that reconnects with the seq of the last message it
+saw gets the gap from the buffer when the buffer covers it contiguously,
+otherwise from an indexed (conversation, seq) range query. Gaps larger
+than REPLAY_MAX_MESSAGES are not replayed; the client is told to resync
+through the REST history instead.
+
+Buffered payloads were built at send time, so ``is_read`` is refreshed
+from the read watermarks before they are replayed.
+"""
+from django.core.cache import cache
+
+from .models import Conversation, ConversationReadState, Message
+
+
+REPLAY_BUFFER_SIZE = 200
+REPLAY_BUFFER_TTL = 60 * 60
+REPLAY_MAX_MESSAGES = 500
+
+
+def buffer_key(conversation_id):
+    return f'replay:{conversation_id}'
+
+
+def remember(conversation_id, payload):
+    """Append a broadcast payload to the conversation's buffer"""
+    key = buffer_key(conversation_id)
+    items = cache.get(key) or []
+    items.append(payload)
+    # Concurrent senders may interleave or drop each other's appends; the
+    # reader checks contiguity and falls back to the database on any hole
+    items.sort(key=lambda item: item['seq'])
+    cache.set(key, items[-REPLAY_BUFFER_SIZE:], REPLAY_BUFFER_TTL)
+
+
+def missed_messages(conversation_id, last_seq, build_payload):
+    """Payloads with seq > last_seq, or None if the gap is too large to replay.
+
+    build_payload turns a Message (with sender and profile loaded) into the
+    broadcast dict for messages that are no longer buffered.
+    """
+    current = Conversation.objects.filter(pk=conversation_id).values_list('last_seq', flat=True).first()
+    if current is None or current <= last_seq:
+        return []
+    if current - last_seq > REPLAY_MAX_MESSAGES:
+        return None
+
+    buffered = [item for item in cache.get(buffer_key(conversation_id)) or [] if item['seq'] > last_seq]
+    expected = list(range(last_seq + 1, current + 1))
+    if [item['seq'] for item in buffered] == expected:
+        return with_read_state(conversation_id, buffered)
+
+    # Buffer evicted or raced; fall back to the database for just the gap
+    messages = Message.objects.filter(
+        conversation_id=conversation_id, seq__gt=last_seq
+    ).select_related('sender', 'sender__profile').order_by('seq')
+    return with_read_state(conversation_id, [build_payload(message) for message in messages])
+
+
+def with_read_state(conversation_id, payloads):
+    """Copies of payloads with is_read taken from the current watermarks"""
+    watermarks = ConversationReadState.watermarks([conversation_id])[conversation_id]
+    return [
+        dict(item, is_read=ConversationReadState.read_by_others(watermarks, item['id'], item['sender']['id']))
+        for item in payloads
+    ]
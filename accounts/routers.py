@@ -0,0 +1,154 @@
+"""
+Primary/replica database routing.
+
+With DATABASE_REPLICAS set (see settings), reads made while serving an
+HTTP request go to a randomly chosen replica and all writes go to
+``default``. A request reads from the primary instead when:
+
+- its method is unsafe (POST, PUT, PATCH, DELETE),
+- its view is decorated with ``use_primary`` (or sets ``use_primary = True``),
+- its user wrote within the last READ_YOUR_WRITES_SECONDS, so they see
+  their own changes despite replica lag,
+- the read happens inside a transaction on the primary.
+
+Code outside a request (WebSocket consumers, management commands,
+background flushes) always uses the primary. State is held in a
+ContextVar so it follows the request across sync_to_async hops.
+"""
+import random
+from contextlib import contextmanager
+from contextvars import ContextVar
+
+from django.conf import settings
+from django.contrib.auth import SESSION_KEY
+from django.core.cache import cache
+from django.db import DEFAULT_DB_ALIAS, connections
+
+
+SAFE_METHODS = ('GET', 'HEAD', 'OPTIONS')
+
+
+class RoutingState:
+    """Routing decisions for the request being served"""
+    __slots__ = ('pinned', 'wrote', 'user_id')
+
+    def __init__(self, pinned=False, user_id=None):
+        self.pinned = pinned
+        self.wrote = False
+        self.user_id = user_id
+
+
+_state = ContextVar('db_routing', default=None)
+
+
+def replica_aliases():
+    return getattr(settings, 'DATABASE_REPLICA_ALIASES', [])
+
+
+def pin_key(user_id):
+    return f'db_pin:{user_id}'
+
+
+class ReplicaRouter:
+    def db_for_read(self, model, **hints):
+        replicas = replica_aliases()
+        state = _state.get()
+        if not replicas or state is None or state.pinned:
+            return DEFAULT_DB_ALIAS
+        if connections[DEFAULT_DB_ALIAS].in_atomic_block:
+            return DEFAULT_DB_ALIAS
+        return random.choice(replicas)
+
+    def db_for_write(self, model, **hints):
+        state = _state.get()
+        if state is not None:
+            state.wrote = True
+            # Later reads in this request must see the write
+            state.pinned = True
+        return DEFAULT_DB_ALIAS
+
+    def allow_relation(self, obj1, obj2, **hints):
+        # Replicas hold the same rows as the primary
+        return True
+
+    def allow_migrate(self, db, app_label, model_name=None, **hints):
+        return db == DEFAULT_DB_ALIAS
+
+
+def use_primary(view):
+    """Opt a view out of replica reads"""
+    view.use_primary = True
+    return view
+
+
+@contextmanager
+def primary():
+    """Route reads in the block to the primary"""
+    state = _state.get()
+    if state is None:
+        yield
+        return
+    pinned, state.pinned = state.pinned, True
+    try:
+        yield
+    finally:
+        state.pinned = pinned or state.wrote
+
+
+def view_wants_primary(view_func):
+    if getattr(view_func, 'use_primary', False):
+        return True
+    # DRF class-based views: as_view() exposes the class as view_func.cls
+    return getattr(getattr(view_func, 'cls', None), 'use_primary', False)
+
+
+def request_user_id(request):
+    """User id from the JWT or session, without touching the user table"""
+    from rest_framework_simplejwt.exceptions import TokenError
+    from rest_framework_simplejwt.settings import api_settings
+    from rest_framework_simplejwt.tokens import AccessToken
+
+    parts = request.META.get(api_settings.AUTH_HEADER_NAME, '').split()
+    if len(parts) == 2 and parts[0] in api_settings.AUTH_HEADER_TYPES:
+        try:
+            return AccessToken(parts[1])[api_settings.USER_ID_CLAIM]
+        except (TokenError, KeyError):
+            return None
+    session = getattr(request, 'session', None)
+    if session is not None and session.session_key:
+        return session.get(SESSION_KEY)
+    return None
+
+
+def begin_request(request):
+    """Set up routing for request; returns the token for end_request()"""
+    if not replica_aliases():
+        return None
+    user_id = request_user_id(request)
+    pinned = request.method not in SAFE_METHODS
+    if not pinned and user_id is not None:
+        pinned = bool(cache.get(pin_key(user_id)))
+    return _state.set(RoutingState(pinned=pinned, user_id=user_id))
+
+
+def end_request(request, token):
+    """Open the read-your-writes window if the request wrote anything"""
+    if token is None:
+        return
+    state = _state.get()
+    _state.reset(token)
+    if state is None or not state.wrote:
+        return
+    user_id = state.user_id
+    if user_id is None:
+        # DRF sets the authenticated user on the underlying request
+        user = getattr(request, 'user', None)
+        user_id = user.pk if user is not None and user.is_authenticated else None
+    if user_id is not None:
+        cache.set(pin_key(user_id), 1, getattr(settings, 'READ_YOUR_WRITES_SECONDS', 5))
+
+
+def pin_current_request():
+    state = _state.get()
+    if state is not None:
+        state.pinned = True
@@ -0,0 +1,184 @@
+"""
+Full-text search over direct messages.
+
+The backend is chosen from the database vendor, or from
+settings.MESSAGE_SEARCH_BACKEND (a dotted path) when set:
+
+- SQLite: an external-content FTS5 table kept in sync by triggers on
+  insert, update and delete, ranked with bm25().
+- PostgreSQL: a GIN expression index on to_tsvector('simple', text),
+  ranked with ts_rank().
+- Anything else (or SQLite built without FTS5): an unranked icontains scan.
+
+Every backend scopes results to conversations the user participates in.
+"""
+import logging
+import re
+from abc import ABC, abstractmethod
+
+from django.conf import settings
+from django.db import OperationalError, connection
+from django.utils.module_loading import import_string
+
+from .models import Conversation, Message
+
+
+logger = logging.getLogger(__name__)
+
+
+def _tables():
+    return Message._meta.db_table, Conversation.participants.through._meta.db_table
+
+
+class SearchBackend(ABC):
+    """Interface: install() and rebuild() manage the index, search() queries it"""
+
+    def install(self):
+        pass
+
+    def rebuild(self):
+        pass
+
+    @abstractmethod
+    def search(self, user, query, limit, offset):
+        """Return a list of (message_id, rank) ordered best match first"""
+
+
+class SQLiteFTS5Backend(SearchBackend):
+    fts_table = 'accounts_message_fts'
+
+    def install(self):
+        messages, _ = _tables()
+        fts = self.fts_table
+        with connection.cursor() as cursor:
+            cursor.execute(
+                f"CREATE VIRTUAL TABLE IF NOT EXISTS {fts} USING fts5("
+                f"text, content='{messages}', content_rowid='id', "
+                f"tokenize='unicode61 remove_diacritics 2')"
+            )
+            cursor.execute(
+                f"CREATE TRIGGER IF NOT EXISTS {fts}_ai AFTER INSERT ON {messages} BEGIN "
+                f"INSERT INTO {fts}(rowid, text) VALUES (new.id, new.text); END"
+            )
+            cursor.execute(
+                f"CREATE TRIGGER IF NOT EXISTS {fts}_ad AFTER DELETE ON {messages} BEGIN "
+                f"INSERT INTO {fts}({fts}, rowid, text) VALUES ('delete', old.id, old.text); END"
+            )
+            cursor.execute(
+                f"CREATE TRIGGER IF NOT EXISTS {fts}_au AFTER UPDATE OF text ON {messages} BEGIN "
+                f"INSERT INTO {fts}({fts}, rowid, text) VALUES ('delete', old.id, old.text); "
+                f"INSERT INTO {fts}(rowid, text) VALUES (new.id, new.text); END"
+            )
+
+    def rebuild(self):
+        with connection.cursor() as cursor:
+            cursor.execute(f"INSERT INTO {self.fts_table}({self.fts_table}) VALUES ('rebuild')")
+
+    @staticmethod
+    def to_match(query):
+        """Quote every term so user input can't inject FTS5 syntax; prefix-match the last"""
+        terms = [term.replace('"', '""') for term in re.findall(r'\w+', query)]
+        if not terms:
+            return None
+        quoted = [f'"{term}"' for term in terms]
+        quoted[-1] += '*'
+        return ' '.join(quoted)
+
+    def search(self, user, query, limit, offset):
+        match = self.to_match(query)
+        if not match:
+            return []
+        messages, participants = _tables()
+        fts = self.fts_table
+        with connection.cursor() as cursor:
+            cursor.execute(
+                f"SELECT m.id, bm25({fts}) AS rank "
+                f"FROM {fts} "
+                f"JOIN {messages} m ON m.id = {fts}.rowid "
+                f"JOIN {participants} p ON p.conversation_id = m.conversation_id AND p.user_id = %s "
+                f"WHERE {fts} MATCH %s "
+                f"ORDER BY rank LIMIT %s OFFSET %s",
+                [user.id, match, limit, offset]
+            )
+            return cursor.fetchall()
+
+
+class PostgresBackend(SearchBackend):
+    index_name = 'accounts_message_text_fts'
+
+    def install(self):
+        messages, _ = _tables()
+        with connection.cursor() as cursor:
+            cursor.execute(
+                f"CREATE INDEX IF NOT EXISTS {self.index_name} ON {messages} "
+                f"USING GIN (to_tsvector('simple', text))"
+            )
+
+    def rebuild(self):
+        with connection.cursor() as cursor:
+            cursor.execute(f"REINDEX INDEX {self.index_name}")
+
+    def search(self, user, query, limit, offset):
+        if not query.strip():
+            return []
+        messages, participants = _tables()
+        with connection.cursor() as cursor:
+            # The WHERE expression must match the index expression exactly
+            cursor.execute(
+                f"SELECT m.id, ts_rank(to_tsvector('simple', m.text), q) AS rank "
+                f"FROM {messages} m "
+                f"JOIN {participants} p ON p.conversation_id = m.conversation_id AND p.user_id = %s, "
+                f"websearch_to_tsquery('simple', %s) q "
+                f"WHERE to_tsvector('simple', m.text) @@ q "
+                f"ORDER BY rank DESC, m.id DESC LIMIT %s OFFSET %s",
+                [user.id, query, limit, offset]
+            )
+            return cursor.fetchall()
+
+
+class ScanBackend(SearchBackend):
+    """Fallback without an index: newest matching messages first"""
+
+    def search(self, user, query, limit, offset):
+        if not query.strip():
+            return []
+        ids = Message.objects.filter(
+            conversation__participants=user,
+            text__icontains=query
+        ).order_by('-created_at', '-id').values_list('id', flat=True)[offset:offset + limit]
+        return [(message_id, 0) for message_id in ids]
+
+
+def get_backend():
+    path = getattr(settings, 'MESSAGE_SEARCH_BACKEND', None)
+    if path:
+        return import_string(path)()
+    if connection.vendor == 'sqlite':
+        return SQLiteFTS5Backend()
+    if connection.vendor == 'postgresql':
+        return PostgresBackend()
+    return ScanBackend()
+
+
+def install_search_index(**kwargs):
+    """post_migrate hook: create the index and its triggers if missing"""
+    backend = get_backend()
+    try:
+        backend.install()
+    except OperationalError as e:
+        # e.g. SQLite compiled without FTS5
+        logger.warning("Message search index not installed (%s); falling back to scans", e)
+
+
+def search_messages(user, query, limit=20, offset=0):
+    """Ranked (message, rank) pairs visible to user"""
+    try:
+        hits = get_backend().search(user, query, limit, offset)
+    except OperationalError as e:
+        logger.warning("Full-text search failed (%s); falling back to scans", e)
+        hits = ScanBackend().search(user, query, limit, offset)
+
+    found = Message.objects.select_related('sender', 'sender__profile').in_bulk(
+        [message_id for message_id, _ in hits]
+    )
+    return [(found[message_id], rank) for message_id, rank in hits if message_id in found]
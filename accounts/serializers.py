@@ -1,6 +1,7 @@
 from rest_framework import serializers
 from django.contrib.auth.models import User
-from .models import Profile, Notification, Conversation, Message, Post, Comment, Story, StoryView, SavedPost
+from django.core.files.storage import default_storage
+from .models import Profile, Notification, Conversation, ConversationReadState, Message, UserNote, Post, Comment, Story, StoryView, SavedPost
 
 
 class UserSerializer(serializers.ModelSerializer):
@@ -22,7 +23,12 @@ class UserSerializer(serializers.ModelSerializer):
     def get_is_following(self, obj):
         request = self.context.get('request')
         if request and request.user.is_authenticated:
-            return obj.profile in request.user.profile.following.all()
+            # Resolved once per serializer tree, not once per user rendered
+            following = self.context.get('_following_user_ids')
+            if following is None:
+                following = set(request.user.profile.following.values_list('user_id', flat=True))
+                self.context['_following_user_ids'] = following
+            return obj.id in following
         return False
 
 
@@ -85,14 +91,39 @@ class NotificationSerializer(serializers.ModelSerializer):
         return None
 
 
+class PreloadedNotificationSerializer(NotificationSerializer):
+    """NotificationSerializer reading target images from ``target_images`` in the context"""
+    
+    def get_target_image(self, obj):
+        if obj.target_type == 'post' and obj.target_id:
+            return self.context['target_images'].get(obj.target_id)
+        if obj.verb == 'follow' and hasattr(obj.actor, 'profile') and obj.actor.profile.avatar:
+            return obj.actor.profile.avatar.url
+        return None
+
+
 class MessageSerializer(serializers.ModelSerializer):
     sender = UserSerializer(read_only=True)
     timestamp = serializers.DateTimeField(source='created_at', read_only=True)
+    is_read = serializers.SerializerMethodField()
     
     class Meta:
         model = Message
-        fields = ('id', 'conversation', 'sender', 'text', 'is_read', 'timestamp', 'created_at')
-        read_only_fields = ('sender', 'conversation', 'created_at', 'timestamp')
+        fields = ('id', 'conversation', 'seq', 'sender', 'text', 'is_read', 'timestamp', 'created_at')
+        read_only_fields = ('sender', 'conversation', 'seq', 'created_at', 'timestamp')
+    
+    def get_is_read(self, obj):
+        """Read once any other participant's watermark has reached the message.
+        
+        Views may preload ``read_watermarks`` (see ConversationReadState.watermarks);
+        conversations missing from it are looked up once and kept in the context.
+        """
+        watermarks = self.context.setdefault('read_watermarks', {})
+        if obj.conversation_id not in watermarks:
+            watermarks.update(ConversationReadState.watermarks([obj.conversation_id]))
+        return ConversationReadState.read_by_others(
+            watermarks[obj.conversation_id], obj.id, obj.sender_id
+        )
 
 
 class ConversationSerializer(serializers.ModelSerializer):
@@ -132,6 +163,109 @@ class ConversationSerializer(serializers.ModelSerializer):
         return 0
 
 
+class InboxConversationSerializer(serializers.ModelSerializer):
+    """Inbox row built only from denormalized columns and annotations.
+
+    Expects a queryset from ``views.inbox_queryset`` so that the whole page
+    is served by one query; output matches ``ConversationSerializer``.
+    """
+    participants = serializers.SerializerMethodField()
+    last_message = serializers.SerializerMethodField()
+    other_user = serializers.SerializerMethodField()
+    current_user_id = serializers.SerializerMethodField()
+    unread_count = serializers.SerializerMethodField()
+    
+    class Meta:
+        model = Conversation
+        fields = ('id', 'participants', 'last_message', 'other_user', 'current_user_id', 'unread_count', 'created_at', 'updated_at')
+        read_only_fields = fields
+    
+    def _viewer(self):
+        return self.context['request'].user
+    
+    @staticmethod
+    def _user(user_id, username, email, first_name, last_name, avatar, bio, is_following):
+        """UserSerializer's output from annotated columns"""
+        return {
+            'id': user_id,
+            'username': username,
+            'email': email,
+            'first_name': first_name,
+            'last_name': last_name,
+            'profile': {
+                'avatar': default_storage.url(avatar) if avatar else None,
+                'bio': bio
+            },
+            'is_following': bool(is_following)
+        }
+    
+    def get_other_user(self, obj):
+        if obj.other_user_id is None:
+            return None
+        return self._user(
+            obj.other_user_id, obj.other_username, obj.other_email, obj.other_first_name,
+            obj.other_last_name, obj.other_avatar, obj.other_bio, obj.other_is_followed
+        )
+    
+    def get_participants(self, obj):
+        # Authentication loads request.user with its profile, so the viewer
+        # costs no query; nobody follows themselves
+        viewer = self._viewer()
+        participants = [self._user(
+            viewer.id, viewer.username, viewer.email, viewer.first_name, viewer.last_name,
+            viewer.profile.avatar.name, viewer.profile.bio, False
+        )]
+        other = self.get_other_user(obj)
+        if other:
+            participants.append(other)
+        return participants
+    
+    def get_last_message(self, obj):
+        if not obj.last_message_id:
+            return None
+        return {
+            'id': obj.last_message_id,
+            'conversation': obj.id,
+            'seq': obj.last_message_seq,
+            'sender': self._user(
+                obj.last_sender_id, obj.last_sender_username, obj.last_sender_email,
+                obj.last_sender_first_name, obj.last_sender_last_name, obj.last_sender_avatar,
+                obj.last_sender_bio, obj.last_sender_is_followed
+            ),
+            'text': obj.last_message_text,
+            'is_read': obj.last_message_is_read,
+            'timestamp': obj.last_message_at,
+            'created_at': obj.last_message_at
+        }
+    
+    def get_current_user_id(self, obj):
+        return self._viewer().id
+    
+    def get_unread_count(self, obj):
+        return obj.unread or 0
+
+
+class UserNoteSerializer(serializers.ModelSerializer):
+    user_id = serializers.IntegerField(source='user.id', read_only=True)
+    username = serializers.CharField(source='user.username', read_only=True)
+    user_avatar = serializers.SerializerMethodField()
+    expires_at = serializers.DateTimeField(read_only=True)
+    
+    class Meta:
+        model = UserNote
+        fields = ('user_id', 'username', 'user_avatar', 'text', 'updated_at', 'expires_at')
+        read_only_fields = ('updated_at',)
+    
+    def get_user_avatar(self, obj):
+        """Safely get user avatar URL"""
+        try:
+            if hasattr(obj.user, 'profile') and obj.user.profile.avatar:
+                return obj.user.profile.avatar.url
+        except:
+            pass
+        return None
+
+
 class UserRegistrationSerializer(serializers.ModelSerializer):
     password = serializers.CharField(write_only=True, style={'input_type': 'password'}, min_length=8)
     password2 = serializers.CharField(write_only=True, style={'input_type': 'password'}, min_length=8)
@@ -222,7 +356,7 @@ class PostSerializer(serializers.ModelSerializer):
         return None
     
     def get_likes_count(self, obj):
-        return obj.likes.count()
+        return obj.likes_count
     
     def get_comments_count(self, obj):
         return obj.comments.count()
@@ -230,7 +364,10 @@ class PostSerializer(serializers.ModelSerializer):
     def get_is_liked(self, obj):
         request = self.context.get('request')
         if request and request.user.is_authenticated:
-            return request.user in obj.likes.all()
+            liked = getattr(obj, 'viewer_has_liked', None)
+            if liked is None:
+                liked = obj.is_liked_by(request.user)
+            return liked
         return False
     
     def get_is_saved(self, obj):
@@ -240,6 +377,26 @@ class PostSerializer(serializers.ModelSerializer):
         return False
 
 
+class PreloadedPostSerializer(PostSerializer):
+    """PostSerializer that runs no queries, for the async views.
+    
+    Expects posts annotated with comments_total, viewer_has_liked and
+    viewer_has_saved, authors with profiles selected, ``comments_by_post``
+    (post id -> comments) and ``_following_user_ids`` in the context.
+    """
+    comments = serializers.SerializerMethodField()
+    
+    def get_comments_count(self, obj):
+        return obj.comments_total
+    
+    def get_is_saved(self, obj):
+        return bool(getattr(obj, 'viewer_has_saved', False))
+    
+    def get_comments(self, obj):
+        comments = self.context['comments_by_post'].get(obj.id, [])
+        return CommentSerializer(comments, many=True, context=self.context).data
+
+
 class PostCreateSerializer(serializers.ModelSerializer):
     class Meta:
         model = Post
@@ -0,0 +1,52 @@
+"""
+Hot view queries must keep using indexes (see accounts/query_plans.py).
+
+The data is seeded with several authors, so the feed's ``author IN (...)``
+filter is planned the way it is in production rather than as a single
+author lookup.
+"""
+from datetime import timedelta
+from io import StringIO
+
+from django.contrib.auth.models import User
+from django.core.management import call_command
+from django.test import TestCase
+from django.utils import timezone
+
+from accounts.models import Comment, Conversation, Message, Notification, Post, SavedPost, Story
+
+
+class HotQueryPlanTests(TestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        viewer = User.objects.create_user('viewer')
+        authors = [User.objects.create_user(f'author{i}') for i in range(5)]
+        viewer.profile.following.add(*[author.profile for author in authors])
+
+        posts = Post.objects.bulk_create([
+            Post(author=author, caption=f'{author.username} post {i}')
+            for author in [viewer, *authors] for i in range(4)
+        ])
+        Comment.objects.bulk_create([
+            Comment(post=post, author=authors[i % len(authors)], text='nice')
+            for i, post in enumerate(posts)
+        ])
+        SavedPost.objects.bulk_create([SavedPost(user=viewer, post=post) for post in posts[::3]])
+        Notification.objects.bulk_create([
+            Notification(recipient=viewer, actor=author, verb='like', target_type='post', target_id=posts[0].id)
+            for author in authors
+        ])
+        Story.objects.bulk_create([
+            Story(user=author, expires_at=timezone.now() + timedelta(hours=12)) for author in authors
+        ])
+        for author in authors:
+            conversation, _ = Conversation.get_or_create_direct(viewer, author)
+            for sender in (viewer, author):
+                Message.objects.create(conversation=conversation, sender=sender, text='hi')
+
+    def test_hot_queries_use_indexes(self):
+        out = StringIO()
+        # --live: explain against this test database and its seed data
+        call_command('explain_hot_queries', live=True, stdout=out)
+        self.assertIn('hot queries use indexes', out.getvalue())
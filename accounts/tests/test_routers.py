@@ -0,0 +1,151 @@
+"""
+ReplicaRouter against two local SQLite replica aliases.
+
+The aliases are built with settings.replica_database() like
+DATABASE_REPLICAS entries, registered for this test class only, and
+pointed at the primary's test database through their TEST MIRROR. Each
+query can then be attributed to the connection that ran it.
+"""
+import tempfile
+from pathlib import Path
+
+from django.contrib.auth.models import User
+from django.core.cache import cache
+from django.db import connections, transaction
+from django.test import RequestFactory, TransactionTestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from rest_framework_simplejwt.tokens import AccessToken
+
+from accounts.cache import users
+from accounts.models import Conversation, Post, like_counter
+from accounts.routers import begin_request, end_request
+from socialapp.settings import replica_database
+
+
+REPLICAS = ['replica_0', 'replica_1']
+
+
+@override_settings(DATABASE_REPLICA_ALIASES=REPLICAS, READ_YOUR_WRITES_SECONDS=5)
+class ReplicaRoutingTests(TransactionTestCase):
+    # Resolved in setUpClass, after the replica aliases exist; naming them
+    # here would make the runner look them up before they are registered
+    databases = '__all__'
+
+    @classmethod
+    def setUpClass(cls):
+        replica_dir = Path(tempfile.gettempdir())
+        for index, alias in enumerate(REPLICAS):
+            connections.settings[alias] = connections.configure_settings({
+                'default': connections.settings['default'],
+                alias: replica_database(replica_dir / f'socialapp_test_replica_{index}.sqlite3'),
+            })[alias]
+            # What the test runner does for TEST MIRROR aliases it sets up
+            mirror = connections[alias].settings_dict['TEST']['MIRROR']
+            connections[alias].creation.set_as_test_mirror(connections[mirror].settings_dict)
+        super().setUpClass()
+
+    @classmethod
+    def tearDownClass(cls):
+        super().tearDownClass()
+        for alias in REPLICAS:
+            connections[alias].close()
+            del connections[alias]
+            del connections.settings[alias]
+
+    def setUp(self):
+        cache.clear()
+        users.clear()
+        self.user = User.objects.create_user('reader', password='pass12345')
+        self.author = User.objects.create_user('author', password='pass12345')
+        self.post = Post.objects.create(author=self.author, caption='hello')
+        self.auth = {'Authorization': f'Bearer {AccessToken.for_user(self.user)}'}
+
+    def tearDown(self):
+        # Write buffered like counts while the test database still exists
+        like_counter.flush()
+
+    def capture(self):
+        return {alias: CaptureQueriesContext(connections[alias]) for alias in ['default', *REPLICAS]}
+
+    def run_request(self, method, path, **kwargs):
+        """Issue a request; return the number of queries each alias ran"""
+        contexts = self.capture()
+        for context in contexts.values():
+            context.__enter__()
+        try:
+            response = getattr(self.client, method)(path, headers=self.auth, **kwargs)
+        finally:
+            for context in contexts.values():
+                context.__exit__(None, None, None)
+        self.assertLess(response.status_code, 400, response.content)
+        return {alias: len(context) for alias, context in contexts.items()}
+
+    def replica_queries(self, counts):
+        return sum(counts[alias] for alias in REPLICAS)
+
+    def test_safe_reads_go_to_a_replica(self):
+        counts = self.run_request('get', '/api/explore/')
+        self.assertEqual(counts['default'], 0)
+        self.assertGreater(self.replica_queries(counts), 0)
+
+    def test_replicas_mirror_the_primary_in_tests(self):
+        for alias in REPLICAS:
+            self.assertEqual(
+                connections[alias].settings_dict['NAME'], connections['default'].settings_dict['NAME']
+            )
+            self.assertTrue(Post.objects.using(alias).filter(pk=self.post.pk).exists())
+
+    def test_unsafe_methods_read_and_write_on_the_primary(self):
+        counts = self.run_request('post', f'/api/posts/{self.post.pk}/like/')
+        self.assertGreater(counts['default'], 0)
+        self.assertEqual(self.replica_queries(counts), 0)
+
+    def test_reads_after_a_write_stay_on_the_primary(self):
+        self.run_request('post', f'/api/posts/{self.post.pk}/like/')
+        counts = self.run_request('get', '/api/explore/')
+        self.assertGreater(counts['default'], 0)
+        self.assertEqual(self.replica_queries(counts), 0)
+
+        # Other users are not pinned by this user's write
+        self.auth = {'Authorization': f'Bearer {AccessToken.for_user(self.author)}'}
+        counts = self.run_request('get', '/api/explore/')
+        self.assertEqual(counts['default'], 0)
+
+    def test_read_your_writes_window_expires(self):
+        self.run_request('post', f'/api/posts/{self.post.pk}/like/')
+        cache.delete(f'db_pin:{self.user.pk}')
+        counts = self.run_request('get', '/api/explore/')
+        self.assertEqual(counts['default'], 0)
+
+    def test_use_primary_views_read_from_the_primary(self):
+        conversation, _ = Conversation.get_or_create_direct(self.user, self.author)
+        counts = self.run_request('get', f'/api/conversations/{conversation.pk}/messages/')
+        self.assertGreater(counts['default'], 0)
+        self.assertEqual(self.replica_queries(counts), 0)
+
+    def test_writes_go_to_the_primary(self):
+        request = RequestFactory().get('/api/explore/', headers=self.auth)
+        token = begin_request(request)
+        try:
+            self.assertIn(Post.objects.all().db, REPLICAS)
+            post = Post(author=self.author, caption='written during a GET')
+            post.save()
+            self.assertEqual(post._state.db, 'default')
+            # The write pins the rest of the request to the primary
+            self.assertEqual(Post.objects.all().db, 'default')
+        finally:
+            end_request(request, token)
+
+    def test_reads_inside_atomic_go_to_the_primary(self):
+        request = RequestFactory().get('/api/explore/', headers=self.auth)
+        token = begin_request(request)
+        try:
+            self.assertIn(Post.objects.all().db, REPLICAS)
+            with transaction.atomic():
+                self.assertEqual(Post.objects.all().db, 'default')
+            self.assertIn(Post.objects.all().db, REPLICAS)
+        finally:
+            end_request(request, token)
+
+    def test_reads_outside_requests_use_the_primary(self):
+        self.assertEqual(Post.objects.all().db, 'default')
@@ -0,0 +1,106 @@
+"""
+Sliding-window rate limits for write and authentication endpoints.
+
+DRF's built-in throttles keep a list of request timestamps per client in
+the cache and rewrite it on every request. These keep two fixed-window
+counters instead (the current and previous window) and weight the
+previous one by how much of it still overlaps the sliding window, so a
+check is one get_many and an allowed request one atomic incr. With the
+Redis cache configured the limits are shared by every worker.
+
+Rates come from REST_FRAMEWORK['DEFAULT_THROTTLE_RATES'] keyed by scope.
+Rejections are counted as ``throttle.rejected.<scope>`` in metrics.
+"""
+from rest_framework.throttling import SimpleRateThrottle
+
+from . import metrics
+
+
+class SlidingWindowThrottle(SimpleRateThrottle):
+    """Limit per authenticated user, or per client IP for anonymous requests"""
+    # Only these methods count against the limit; None means all
+    methods = None
+
+    def get_cache_key(self, request, view):
+        if request.user and request.user.is_authenticated:
+            ident = f'user:{request.user.pk}'
+        else:
+            ident = f'ip:{self.get_ident(request)}'
+        return self.cache_format % {'scope': self.scope, 'ident': ident}
+
+    def allow_request(self, request, view):
+        if self.rate is None:
+            return True
+        if self.methods is not None and request.method not in self.methods:
+            return True
+        self.key = self.get_cache_key(request, view)
+        if self.key is None:
+            return True
+
+        now = self.timer()
+        window = int(now // self.duration)
+        current_key = f'{self.key}:{window}'
+        previous_key = f'{self.key}:{window - 1}'
+        counts = self.cache.get_many([current_key, previous_key])
+        self.current = counts.get(current_key, 0)
+        self.previous = counts.get(previous_key, 0)
+        self.elapsed = now - window * self.duration
+
+        overlap = 1 - self.elapsed / self.duration
+        if self.previous * overlap + self.current >= self.num_requests:
+            metrics.incr(f'throttle.rejected.{self.scope}')
+            return False
+
+        # Keep each counter for two windows so it can serve as "previous"
+        self.cache.add(current_key, 0, self.duration * 2)
+        try:
+            self.cache.incr(current_key)
+        except ValueError:
+            # Evicted between add and incr
+            self.cache.set(current_key, 1, self.duration * 2)
+        return True
+
+    def wait(self):
+        """Seconds until the weighted count drops below the limit"""
+        remaining = self.duration - self.elapsed
+        if self.current < self.num_requests and self.previous:
+            # previous * (1 - (elapsed + t) / duration) + current < num_requests
+            wait = self.duration * (1 - (self.num_requests - self.current) / self.previous) - self.elapsed
+            if wait < remaining:
+                return max(0.0, wait)
+        # Not within this window: the current count becomes the next window's
+        # "previous", so current * (1 - t / duration) < num_requests as well
+        next_window = self.duration * (1 - self.num_requests / self.current) if self.current else 0.0
+        return remaining + max(0.0, next_window)
+
+
+class IPSlidingWindowThrottle(SlidingWindowThrottle):
+    """Limit per client IP even for authenticated requests (auth endpoints)"""
+
+    def get_cache_key(self, request, view):
+        return self.cache_format % {'scope': self.scope, 'ident': f'ip:{self.get_ident(request)}'}
+
+
+class LikeThrottle(SlidingWindowThrottle):
+    scope = 'likes'
+
+
+class FollowThrottle(SlidingWindowThrottle):
+    scope = 'follows'
+
+
+class CommentThrottle(SlidingWindowThrottle):
+    scope = 'comments'
+    methods = ('POST',)
+
+
+class LoginThrottle(IPSlidingWindowThrottle):
+    scope = 'login'
+
+
+class RegisterThrottle(IPSlidingWindowThrottle):
+    scope = 'register'
+
+
+class PasswordResetThrottle(IPSlidingWindowThrottle):
+    scope = 'password_reset'
@@ -1,16 +1,19 @@
 from django.urls import path
-from rest_framework_simplejwt.views import TokenObtainPairView, TokenRefreshView
-from . import views
+from rest_framework_simplejwt.views import TokenRefreshView
+from . import async_views, views
 
 urlpatterns = [
     # Authentication
     path('register/', views.RegisterView.as_view(), name='register'),
-    path('login/', TokenObtainPairView.as_view(), name='login'),
+    path('login/', views.LoginView.as_view(), name='login'),
     path('logout/', views.logout_view, name='logout'),
     path('token/refresh/', TokenRefreshView.as_view(), name='token_refresh'),
     path('auth/get-jwt-token/', views.get_jwt_token, name='get-jwt-token'),
     path('auth/debug/', views.debug_auth_status, name='debug-auth-status'),
     
+    # Metrics
+    path('metrics/', views.metrics_view, name='metrics'),
+    
     # Profile
     path('profile/me/', views.MyProfileView.as_view(), name='my-profile'),
     path('profile/<str:username>/', views.ProfileDetailView.as_view(), name='profile-detail'),
@@ -35,8 +38,14 @@ urlpatterns = [
     # Conversations & Messages
     path('conversations/', views.ConversationListView.as_view(), name='conversations'),
     path('conversations/create/', views.create_conversation, name='create-conversation'),
+    path('conversations/requests/', views.MessageRequestListView.as_view(), name='message-requests'),
+    path('conversations/requests/accept/', views.accept_message_requests, name='accept-message-requests'),
+    path('conversations/requests/decline/', views.decline_message_requests, name='decline-message-requests'),
     path('conversations/<int:pk>/', views.ConversationDetailView.as_view(), name='conversation-detail'),
     path('conversations/<int:conversation_id>/messages/', views.MessageListView.as_view(), name='messages'),
+    path('messages/search/', views.search_messages_view, name='search-messages'),
+    path('presence/', views.presence_view, name='presence'),
+    path('notes/', views.notes_tray, name='notes-tray'),
     
     # Posts (merged from posts app)
     path('posts/', views.PostListCreateView.as_view(), name='post-list-create'),
@@ -50,6 +59,12 @@ urlpatterns = [
     path('feed/', views.feed_view, name='feed'),
     path('explore/', views.explore_view, name='explore'),
     
+    # Async read endpoints (see async_views.py)
+    path('async/feed/', async_views.feed_view, name='async-feed'),
+    path('async/explore/', async_views.explore_view, name='async-explore'),
+    path('async/notifications/', async_views.notifications_view, name='async-notifications'),
+    path('async/conversations/', async_views.conversations_view, name='async-conversations'),
+    
     # Stories (merged from posts app)
     path('stories/', views.StoryListCreateView.as_view(), name='story-list-create'),
     path('stories/<int:pk>/', views.StoryDetailView.as_view(), name='story-detail'),
@@ -1,7 +1,8 @@
 from rest_framework import generics, status, permissions
-from rest_framework.decorators import api_view, permission_classes, authentication_classes
+from rest_framework.decorators import api_view, permission_classes, authentication_classes, throttle_classes
 from rest_framework.response import Response
-from rest_framework.permissions import IsAuthenticated, AllowAny, IsAuthenticatedOrReadOnly
+from rest_framework.permissions import IsAuthenticated, AllowAny, IsAuthenticatedOrReadOnly, IsAdminUser
+from rest_framework_simplejwt.views import TokenObtainPairView
 from django.views.decorators.csrf import csrf_exempt
 from django.utils.decorators import method_decorator
 from django.contrib.auth.models import User
@@ -9,16 +10,31 @@ from django.shortcuts import get_object_or_404
 from django.contrib.auth.tokens import default_token_generator
 from django.utils.http import urlsafe_base64_encode, urlsafe_base64_decode
 from django.utils.encoding import force_bytes, force_str
-from django.core.mail import send_mail
 from django.conf import settings
 from django.utils import timezone
-from django.db.models import Q
-from .models import Profile, Notification, Conversation, Message, Post, Comment, Story, StoryView, SavedPost
+from datetime import timedelta
+from django.db import transaction
+from django.db.models import Q, Exists, F, OuterRef, Subquery
+from django.core.cache import cache
+from .models import (
+    Profile, Notification, Conversation, ConversationReadState, Message,
+    MessageRequest, UserNote, Post, Comment, Story, StoryView, SavedPost
+)
 from .serializers import (
     ProfileSerializer, UserSerializer, NotificationSerializer,
     ConversationSerializer, MessageSerializer, UserRegistrationSerializer,
     PostSerializer, PostCreateSerializer, CommentSerializer,
-    StorySerializer, StoryViewSerializer
+    StorySerializer, StoryViewSerializer, InboxConversationSerializer,
+    UserNoteSerializer
+)
+from .pagination import InboxCursorPagination, MessageKeysetPagination
+from . import metrics, presence
+from .search import search_messages
+from .mail import queue_mail
+from .consumers import notify_conversation_created, notify_message_created
+from .throttling import (
+    CommentThrottle, FollowThrottle, LikeThrottle, LoginThrottle,
+    PasswordResetThrottle, RegisterThrottle
 )
 
 
@@ -29,6 +45,12 @@ class RegisterView(generics.CreateAPIView):
     serializer_class = UserRegistrationSerializer
     permission_classes = [AllowAny]
     authentication_classes = []  # Remove session authentication for this view
+    throttle_classes = [RegisterThrottle]
+
+
+class LoginView(TokenObtainPairView):
+    """Obtain a JWT pair, rate limited per client IP"""
+    throttle_classes = [LoginThrottle]
 
 
 class MyProfileView(generics.RetrieveUpdateAPIView):
@@ -65,6 +87,7 @@ class ProfileDetailView(generics.RetrieveAPIView):
 
 @api_view(['POST'])
 @permission_classes([IsAuthenticated])
+@throttle_classes([FollowThrottle])
 def follow_user(request, username):
     """Toggle follow/unfollow a user"""
     import logging
@@ -284,18 +307,135 @@ def mark_notifications_read(request):
     return Response({'status': 'success'})
 
 
+INBOX_PRIMARY = 'primary'
+INBOX_REQUESTS = 'requests'
+
+
+def inbox_queryset(user, folder=INBOX_PRIMARY):
+    """Conversations of user with everything the inbox row needs annotated.
+    
+    The other participant and their profile, the last message with its
+    sender and read state, follow states and the viewer's unread counter
+    all come from joins and correlated subqueries, so a page of the inbox
+    is one SELECT. ``folder`` selects
+    the primary inbox or pending message requests addressed to user.
+    """
+    Participant = Conversation.participants.through
+    others = Participant.objects.filter(
+        conversation_id=OuterRef('pk')
+    ).exclude(user_id=user.pk).order_by('id')
+    Following = Profile.following.through
+    unread = ConversationReadState.objects.filter(
+        conversation_id=OuterRef('pk'), user_id=user.pk
+    ).values('unread_count')[:1]
+    # Requests to user that were not accepted; declined ones stay hidden
+    unaccepted = MessageRequest.objects.filter(
+        conversation_id=OuterRef('pk'), recipient_id=user.pk, is_accepted=False
+    )
+    
+    conversations = Conversation.objects.filter(participants=user)
+    if folder == INBOX_REQUESTS:
+        conversations = conversations.filter(Exists(unaccepted.filter(is_declined=False)))
+    else:
+        conversations = conversations.exclude(Exists(unaccepted))
+    
+    # The last message is read once a participant other than its sender
+    # has moved their watermark up to it
+    last_message_read = ConversationReadState.objects.filter(
+        conversation_id=OuterRef('pk'), last_read_message_id__gte=OuterRef('last_message_id')
+    ).exclude(user_id=OuterRef('last_message__sender_id'))
+    
+    return conversations.annotate(
+        other_user_id=Subquery(others.values('user_id')[:1]),
+        other_username=Subquery(others.values('user__username')[:1]),
+        other_email=Subquery(others.values('user__email')[:1]),
+        other_first_name=Subquery(others.values('user__first_name')[:1]),
+        other_last_name=Subquery(others.values('user__last_name')[:1]),
+        other_avatar=Subquery(others.values('user__profile__avatar')[:1]),
+        other_bio=Subquery(others.values('user__profile__bio')[:1]),
+        other_is_followed=Exists(
+            Following.objects.filter(
+                from_profile__user_id=user.pk,
+                to_profile__user_id=OuterRef('other_user_id')
+            )
+        ),
+        last_message_text=F('last_message__text'),
+        last_message_seq=F('last_message__seq'),
+        last_message_is_read=Exists(last_message_read),
+        last_sender_id=F('last_message__sender_id'),
+        last_sender_username=F('last_message__sender__username'),
+        last_sender_email=F('last_message__sender__email'),
+        last_sender_first_name=F('last_message__sender__first_name'),
+        last_sender_last_name=F('last_message__sender__last_name'),
+        last_sender_avatar=F('last_message__sender__profile__avatar'),
+        last_sender_bio=F('last_message__sender__profile__bio'),
+        last_sender_is_followed=Exists(
+            Following.objects.filter(
+                from_profile__user_id=user.pk,
+                to_profile__user_id=OuterRef('last_sender_id')
+            )
+        ),
+        unread=Subquery(unread),
+    )
+
+
 class ConversationListView(generics.ListAPIView):
-    """List all conversations for current user"""
-    serializer_class = ConversationSerializer
+    """List conversations for current user, newest activity first"""
+    serializer_class = InboxConversationSerializer
     permission_classes = [IsAuthenticated]
+    pagination_class = InboxCursorPagination
+    folder = INBOX_PRIMARY
     
     def get_queryset(self):
-        return Conversation.objects.filter(participants=self.request.user)
+        return inbox_queryset(self.request.user, self.folder)
     
     def get_serializer_context(self):
         return {'request': self.request}
 
 
+class MessageRequestListView(ConversationListView):
+    """List pending message requests from people the user doesn't follow"""
+    folder = INBOX_REQUESTS
+
+
+def _respond_to_requests(request, **changes):
+    conversation_ids = request.data.get('conversation_ids')
+    if not isinstance(conversation_ids, list) or not conversation_ids:
+        return Response(
+            {'error': 'conversation_ids must be a non-empty list'},
+            status=status.HTTP_400_BAD_REQUEST
+        )
+    try:
+        conversation_ids = [int(conversation_id) for conversation_id in conversation_ids[:100]]
+    except (TypeError, ValueError):
+        return Response(
+            {'error': 'conversation_ids must be integers'},
+            status=status.HTTP_400_BAD_REQUEST
+        )
+    
+    updated = MessageRequest.objects.filter(
+        recipient=request.user,
+        conversation_id__in=conversation_ids,
+        is_accepted=False,
+        is_declined=False
+    ).update(**changes)
+    return Response({'updated': updated})
+
+
+@api_view(['POST'])
+@permission_classes([IsAuthenticated])
+def accept_message_requests(request):
+    """Move pending requests into the primary inbox (bulk)"""
+    return _respond_to_requests(request, is_accepted=True)
+
+
+@api_view(['POST'])
+@permission_classes([IsAuthenticated])
+def decline_message_requests(request):
+    """Hide pending requests (bulk)"""
+    return _respond_to_requests(request, is_declined=True)
+
+
 class ConversationDetailView(generics.RetrieveAPIView):
     """Get conversation details"""
     serializer_class = ConversationSerializer
@@ -310,41 +450,136 @@ class ConversationDetailView(generics.RetrieveAPIView):
 
 class MessageListView(generics.ListCreateAPIView):
     """List messages in a conversation and create new messages"""
+    # Messages arrive over WebSockets, outside the read-your-writes window
+    use_primary = True
     serializer_class = MessageSerializer
     permission_classes = [IsAuthenticated]
+    pagination_class = MessageKeysetPagination
     
     def get_queryset(self):
         conversation_id = self.kwargs.get('conversation_id')
-        return Message.objects.filter(conversation_id=conversation_id)
+        return Message.objects.filter(
+            conversation_id=conversation_id
+        ).select_related('sender', 'sender__profile')
     
     def list(self, request, *args, **kwargs):
-        """Override list to mark messages as read when fetched"""
-        response = super().list(request, *args, **kwargs)
-        
-        # Mark all unread messages in this conversation as read
+        """Override list to mark the conversation read when fetched"""
         conversation_id = self.kwargs.get('conversation_id')
-        Message.objects.filter(
-            conversation_id=conversation_id,
-            is_read=False
-        ).exclude(sender=request.user).update(is_read=True)
-        
-        return response
+        # Moves the watermark only; individual messages are never rewritten
+        ConversationReadState.mark_read(conversation_id, request.user)
+        return super().list(request, *args, **kwargs)
+    
+    def get_serializer_context(self):
+        context = super().get_serializer_context()
+        if self.request.method == 'GET':
+            context['read_watermarks'] = ConversationReadState.watermarks(
+                [self.kwargs.get('conversation_id')]
+            )
+        return context
     
     def perform_create(self, serializer):
         conversation_id = self.kwargs.get('conversation_id')
         conversation = get_object_or_404(Conversation, id=conversation_id)
         
         # Check if user is participant
-        if self.request.user not in conversation.participants.all():
+        participant_ids = list(conversation.participants.values_list('id', flat=True))
+        if self.request.user.id not in participant_ids:
             return Response(
                 {'error': 'You are not a participant in this conversation'},
                 status=status.HTTP_403_FORBIDDEN
             )
         
-        serializer.save(
+        message = serializer.save(
             sender=self.request.user,
             conversation=conversation
         )
+        # Replay buffer and open sockets, like messages sent over the socket
+        transaction.on_commit(
+            lambda: notify_message_created(message, self.request.user, participant_ids)
+        )
+
+
+NOTES_TRAY_CACHE_SECONDS = 300
+
+
+@api_view(['GET', 'POST'])
+@permission_classes([IsAuthenticated])
+def notes_tray(request):
+    """GET: active notes of the user and the people they follow. POST: set your note."""
+    user = request.user
+    
+    if request.method == 'POST':
+        text = (request.data.get('text') or '').strip()
+        if len(text) > 60:
+            return Response(
+                {'error': 'Notes can be at most 60 characters'},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+        note, _ = UserNote.objects.update_or_create(user=user, defaults={'text': text})
+        return Response(UserNoteSerializer(note).data)
+    
+    key = UserNote.tray_cache_key(user.id)
+    cached = cache.get(key)
+    now = timezone.now()
+    if cached is not None and cached['valid_until'] > now:
+        return Response(cached['notes'])
+    
+    # One query: own note plus notes of every followed profile, newest first.
+    # Followed ids come from a subquery; joining through followers would
+    # repeat the viewer's own note once per follower.
+    followed_ids = Profile.objects.filter(followers__user_id=user.id).values('user_id')
+    notes = list(
+        UserNote.objects.filter(
+            Q(user_id=user.id) | Q(user_id__in=followed_ids),
+            updated_at__gt=now - UserNote.LIFETIME
+        ).exclude(text='').select_related('user', 'user__profile').order_by('-updated_at')
+    )
+    data = UserNoteSerializer(notes, many=True).data
+    
+    # Cache until the first note expires; note and follow changes invalidate it
+    valid_until = min(
+        [note.expires_at for note in notes] + [now + timedelta(seconds=NOTES_TRAY_CACHE_SECONDS)]
+    )
+    cache.set(
+        key,
+        {'notes': data, 'valid_until': valid_until},
+        max(1, int((valid_until - now).total_seconds()))
+    )
+    return Response(data)
+
+
+@api_view(['GET'])
+@permission_classes([IsAuthenticated])
+def search_messages_view(request):
+    """Ranked full-text search over the current user's conversations"""
+    query = request.GET.get('q', '').strip()
+    if not query:
+        return Response({'results': [], 'page': 1, 'has_more': False})
+    
+    try:
+        page = max(1, int(request.GET.get('page', 1)))
+    except ValueError:
+        page = 1
+    page_size = 20
+    
+    # Fetch one extra row to know whether another page exists
+    hits = search_messages(request.user, query, limit=page_size + 1, offset=(page - 1) * page_size)
+    messages = [message for message, _ in hits[:page_size]]
+    watermarks = ConversationReadState.watermarks({message.conversation_id for message in messages})
+    serializer = MessageSerializer(
+        messages,
+        many=True,
+        context={'request': request, 'read_watermarks': watermarks}
+    )
+    results = serializer.data
+    for item, (_, rank) in zip(results, hits):
+        item['rank'] = rank
+    
+    return Response({
+        'results': results,
+        'page': page,
+        'has_more': len(hits) > page_size
+    })
 
 
 @api_view(['POST'])
@@ -366,20 +601,15 @@ def create_conversation(request):
             status=status.HTTP_400_BAD_REQUEST
         )
     
-    # Check if conversation already exists
-    existing = Conversation.objects.filter(
-        participants=request.user
-    ).filter(participants=other_user).first()
+    # Single unique-index lookup on the ordered user-id pair; also files the
+    # thread as a message request if other_user doesn't follow the sender
+    conversation, created = Conversation.get_or_create_direct(request.user, other_user)
     
-    if existing:
-        serializer = ConversationSerializer(existing, context={'request': request})
+    serializer = ConversationSerializer(conversation, context={'request': request})
+    if not created:
         return Response(serializer.data)
     
-    # Create new conversation
-    conversation = Conversation.objects.create()
-    conversation.participants.add(request.user, other_user)
-    
-    serializer = ConversationSerializer(conversation, context={'request': request})
+    notify_conversation_created(conversation.id, [request.user.id, other_user.id])
     return Response(serializer.data, status=status.HTTP_201_CREATED)
 
 
@@ -387,6 +617,7 @@ def create_conversation(request):
 @api_view(['POST'])
 @authentication_classes([])
 @permission_classes([AllowAny])
+@throttle_classes([PasswordResetThrottle])
 def password_reset_request(request):
     """Validate username for password reset"""
     username = request.data.get('username')
@@ -399,6 +630,19 @@ def password_reset_request(request):
     
     try:
         user = User.objects.get(username=username)
+        
+        # Also email a reset link; the queue sends it in the background
+        if user.email:
+            uid = urlsafe_base64_encode(force_bytes(user.pk))
+            token = default_token_generator.make_token(user)
+            queue_mail(
+                'Reset your password',
+                f"Use this link to reset your password:\n\n"
+                f"{settings.FRONTEND_URL}/reset-password/{uid}/{token}/\n\n"
+                f"If you didn't ask for a reset, you can ignore this email.",
+                [user.email]
+            )
+        
         return Response({
             'message': 'Username found',
             'username': username,
@@ -416,6 +660,7 @@ def password_reset_request(request):
 @api_view(['POST'])
 @authentication_classes([])
 @permission_classes([AllowAny])
+@throttle_classes([PasswordResetThrottle])
 def password_reset_direct(request):
     """Reset password directly with username and new password"""
     username = request.data.get('username')
@@ -627,7 +872,51 @@ def debug_auth_status(request):
     })
 
 
+@api_view(['GET'])
+@permission_classes([IsAuthenticated])
+def presence_view(request):
+    """Bulk online/last-seen lookup: ?ids=1,2,3 (at most 100 ids)"""
+    try:
+        user_ids = [int(value) for value in request.GET.get('ids', '').split(',') if value.strip()][:100]
+    except ValueError:
+        return Response(
+            {'error': 'ids must be a comma-separated list of user ids'},
+            status=status.HTTP_400_BAD_REQUEST
+        )
+    
+    online = presence.online_user_ids(user_ids)
+    stored = dict(
+        Profile.objects.filter(user_id__in=user_ids).values_list('user_id', 'last_seen')
+    )
+    result = {}
+    for user_id in user_ids:
+        seen = presence.last_seen.pending(user_id) or stored.get(user_id)
+        result[user_id] = {
+            'online': user_id in online,
+            'last_seen': seen.isoformat() if seen else None
+        }
+    return Response(result)
+
+
+@api_view(['GET'])
+@permission_classes([IsAdminUser])
+def metrics_view(request):
+    """Counters collected by this worker process (staff only)"""
+    return Response(metrics.snapshot(request.GET.get('prefix', '')))
+
+
 # Posts Views (merged from posts app)
+def with_like_state(queryset, user):
+    """Annotate viewer_has_liked with an EXISTS on the (post, user) unique index"""
+    if not user.is_authenticated:
+        return queryset
+    return queryset.annotate(
+        viewer_has_liked=Exists(
+            Post.likes.through.objects.filter(post_id=OuterRef('pk'), user_id=user.pk)
+        )
+    )
+
+
 class PostListCreateView(generics.ListCreateAPIView):
     """List all posts and create new posts"""
     permission_classes = [IsAuthenticatedOrReadOnly]
@@ -638,7 +927,10 @@ class PostListCreateView(generics.ListCreateAPIView):
         return PostSerializer
     
     def get_queryset(self):
-        return Post.objects.select_related('author').prefetch_related('likes', 'comments')
+        return with_like_state(
+            Post.objects.select_related('author').prefetch_related('comments'),
+            self.request.user
+        )
     
     def perform_create(self, serializer):
         serializer.save(author=self.request.user)
@@ -650,7 +942,10 @@ class PostDetailView(generics.RetrieveUpdateDestroyAPIView):
     permission_classes = [IsAuthenticatedOrReadOnly]
     
     def get_queryset(self):
-        return Post.objects.select_related('author').prefetch_related('likes', 'comments', 'comments__author')
+        return with_like_state(
+            Post.objects.select_related('author').prefetch_related('comments', 'comments__author'),
+            self.request.user
+        )
     
     def get_serializer_context(self):
         context = super().get_serializer_context()
@@ -684,16 +979,18 @@ class PostDetailView(generics.RetrieveUpdateDestroyAPIView):
 
 @api_view(['POST'])
 @permission_classes([IsAuthenticated])
+@throttle_classes([LikeThrottle])
 def toggle_like(request, pk):
     """Toggle like on a post"""
-    post = get_object_or_404(Post, pk=pk)
+    post = get_object_or_404(Post.objects.only('id', 'author_id', 'like_count'), pk=pk)
     
-    if request.user in post.likes.all():
+    # Single indexed lookup instead of loading every liker of the post
+    if post.is_liked_by(request.user):
         post.likes.remove(request.user)
-        return Response({'status': 'unliked'}, status=status.HTTP_200_OK)
+        return Response({'status': 'unliked', 'likes_count': post.likes_count}, status=status.HTTP_200_OK)
     else:
         post.likes.add(request.user)
-        return Response({'status': 'liked'}, status=status.HTTP_200_OK)
+        return Response({'status': 'liked', 'likes_count': post.likes_count}, status=status.HTTP_200_OK)
 
 
 @api_view(['POST'])
@@ -717,6 +1014,7 @@ class CommentListCreateView(generics.ListCreateAPIView):
     """List comments for a post and create new comments"""
     serializer_class = CommentSerializer
     permission_classes = [IsAuthenticatedOrReadOnly]
+    throttle_classes = [CommentThrottle]
     
     def get_queryset(self):
         post_id = self.kwargs.get('post_id')
@@ -737,9 +1035,9 @@ def feed_view(request):
     following_users = [profile.user for profile in following_profiles]
     
     # Get posts from followed users
-    posts = Post.objects.filter(
+    posts = with_like_state(Post.objects.filter(
         author__in=following_users
-    ).select_related('author').prefetch_related('likes', 'comments').order_by('-created_at')
+    ).select_related('author').prefetch_related('comments').order_by('-created_at'), user)
     
     # Paginate manually or use DRF pagination
     page = int(request.GET.get('page', 1))
@@ -765,7 +1063,10 @@ def feed_view(request):
 @permission_classes([IsAuthenticatedOrReadOnly])
 def explore_view(request):
     """Get random/recommended posts for explore page"""
-    posts = Post.objects.select_related('author').prefetch_related('likes', 'comments', 'comments__author').order_by('-created_at')[:20]
+    posts = with_like_state(
+        Post.objects.select_related('author').prefetch_related('comments', 'comments__author'),
+        request.user
+    ).order_by('-created_at')[:20]
     serializer = PostSerializer(posts, many=True, context={'request': request})
     return Response(serializer.data)
 
@@ -839,6 +1140,6 @@ class StoryDetailView(generics.RetrieveDestroyAPIView):
 def user_posts(request, username):
     """Get all posts for a specific user"""
     user = get_object_or_404(User, username=username)
-    posts = Post.objects.filter(author=user).order_by('-created_at')
+    posts = with_like_state(Post.objects.filter(author=user), request.user).order_by('-created_at')
     serializer = PostSerializer(posts, many=True, context={'request': request})
     return Response(serializer.data)
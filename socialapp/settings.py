@@ -13,6 +13,7 @@ https://docs.djangoproject.com/en/5.2/ref/settings/
 from pathlib import Path
 import os
 from dotenv import load_dotenv
+from django.core.exceptions import ImproperlyConfigured
 
 # Load environment variables from .env file
 load_dotenv()
@@ -68,6 +69,7 @@ MIDDLEWARE = [
     'django.middleware.common.CommonMiddleware',
     'django.middleware.csrf.CsrfViewMiddleware',
     'django.contrib.auth.middleware.AuthenticationMiddleware',
+    'accounts.middleware.ReplicaRoutingMiddleware',
     'django.contrib.messages.middleware.MessageMiddleware',
     'django.middleware.clickjacking.XFrameOptionsMiddleware',
     'allauth.account.middleware.AccountMiddleware',  # Required for django-allauth
@@ -95,23 +97,127 @@ WSGI_APPLICATION = 'socialapp.wsgi.application'
 ASGI_APPLICATION = 'socialapp.asgi.application'
 
 # Channels configuration
-CHANNEL_LAYERS = {
-    'default': {
-        'BACKEND': 'channels.layers.InMemoryChannelLayer'
+# InMemoryChannelLayer only delivers within one process. Set CHANNEL_REDIS_HOSTS
+# to a comma-separated list of redis:// URLs to run several Daphne workers;
+# channels_redis shards channels and groups across all listed hosts.
+CHANNEL_REDIS_HOSTS = [
+    host.strip() for host in os.getenv('CHANNEL_REDIS_HOSTS', '').split(',') if host.strip()
+]
+CHANNEL_LAYER_BACKEND = os.getenv('CHANNEL_LAYER_BACKEND', 'channels_redis.core.RedisChannelLayer')
+
+if CHANNEL_REDIS_HOSTS and CHANNEL_LAYER_BACKEND == 'channels_redis.pubsub.RedisPubSubChannelLayer':
+    CHANNEL_LAYERS = {
+        'default': {
+            'BACKEND': CHANNEL_LAYER_BACKEND,
+            'CONFIG': {
+                'hosts': CHANNEL_REDIS_HOSTS,
+                'prefix': 'socialapp',
+            },
+        }
+    }
+elif CHANNEL_REDIS_HOSTS:
+    CHANNEL_LAYERS = {
+        'default': {
+            'BACKEND': CHANNEL_LAYER_BACKEND,
+            'CONFIG': {
+                'hosts': CHANNEL_REDIS_HOSTS,
+                'prefix': 'socialapp',
+                'capacity': 1500,       # Messages buffered per channel before ChannelFull
+                'expiry': 10,           # Seconds an undelivered message is kept
+                'group_expiry': 86400,  # Drop group memberships of dead consumers after a day
+            },
+        }
+    }
+else:
+    CHANNEL_LAYERS = {
+        'default': {
+            'BACKEND': 'channels.layers.InMemoryChannelLayer'
+        }
+    }
+
+
+# Cache
+# Presence, rate limits and other cross-request state need a cache shared by
+# every worker in production; set CACHE_REDIS_URL to enable it.
+CACHE_REDIS_URL = os.getenv('CACHE_REDIS_URL')
+
+if CACHE_REDIS_URL:
+    CACHES = {
+        'default': {
+            'BACKEND': 'django.core.cache.backends.redis.RedisCache',
+            'LOCATION': CACHE_REDIS_URL,
+            'KEY_PREFIX': 'socialapp',
+        }
+    }
+else:
+    CACHES = {
+        'default': {
+            'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+        }
     }
-}
 
 
 # Database
 # https://docs.djangoproject.com/en/5.2/ref/settings/#databases
 
+# Seconds a connection waits on a locked database before raising
+SQLITE_TIMEOUT = int(os.getenv('SQLITE_TIMEOUT', '20'))
+
 DATABASES = {
     'default': {
         'ENGINE': 'django.db.backends.sqlite3',
         'NAME': BASE_DIR / 'db.sqlite3',
+        'OPTIONS': {'timeout': SQLITE_TIMEOUT},
+        # Reuse connections across requests so pragmas are applied once
+        'CONN_MAX_AGE': int(os.getenv('DB_CONN_MAX_AGE', '60')),
+        'CONN_HEALTH_CHECKS': True,
     }
 }
 
+# Read replicas: comma-separated database files (e.g. kept in sync with
+# litestream or sqlite3 .backup), exposed as replica_0, replica_1, ...
+# Reads inside HTTP requests go to a replica; see accounts/routers.py.
+DATABASE_REPLICAS = [
+    name.strip() for name in os.getenv('DATABASE_REPLICAS', '').split(',') if name.strip()
+]
+
+
+def replica_database(name):
+    # Tests read replicas through the primary's test database
+    return {**DATABASES['default'], 'NAME': name, 'TEST': {'MIRROR': 'default'}}
+
+
+DATABASE_REPLICA_ALIASES = []
+for index, name in enumerate(DATABASE_REPLICAS):
+    alias = f'replica_{index}'
+    DATABASES[alias] = replica_database(name)
+    DATABASE_REPLICA_ALIASES.append(alias)
+
+DATABASE_ROUTERS = ['accounts.routers.ReplicaRouter']
+
+# Seconds a user's reads stay on the primary after they write
+READ_YOUR_WRITES_SECONDS = int(os.getenv('READ_YOUR_WRITES_SECONDS', '5'))
+
+# Pragmas applied to every new SQLite connection (see accounts/db.py).
+# SQLITE_PROFILE=default keeps SQLite's stock rollback journal.
+SQLITE_PROFILE = os.getenv('SQLITE_PROFILE', 'production')
+SQLITE_PROFILES = {
+    'production': {
+        'journal_mode': 'WAL',          # Readers no longer block on the writer
+        'synchronous': 'NORMAL',        # fsync at checkpoints only; safe with WAL
+        'busy_timeout': SQLITE_TIMEOUT * 1000,  # Milliseconds; matches OPTIONS['timeout']
+        'cache_size': -64000,           # KiB (negative) of page cache per connection
+        'mmap_size': 256 * 1024 * 1024,
+        'temp_store': 'MEMORY',
+    },
+    'default': {},
+}
+if SQLITE_PROFILE not in SQLITE_PROFILES:
+    raise ImproperlyConfigured(
+        f"SQLITE_PROFILE must be one of {', '.join(SQLITE_PROFILES)}, not {SQLITE_PROFILE!r}"
+    )
+SQLITE_PRAGMAS = SQLITE_PROFILES[SQLITE_PROFILE]
+
 
 # Password validation
 # https://docs.djangoproject.com/en/5.2/ref/settings/#auth-password-validators
@@ -162,7 +268,7 @@ MEDIA_ROOT = BASE_DIR / 'media'
 # REST Framework
 REST_FRAMEWORK = {
     'DEFAULT_AUTHENTICATION_CLASSES': (
-        'rest_framework_simplejwt.authentication.JWTAuthentication',
+        'accounts.authentication.CachedJWTAuthentication',
         'rest_framework.authentication.SessionAuthentication',
     ),
     'DEFAULT_PERMISSION_CLASSES': [
@@ -170,6 +276,15 @@ REST_FRAMEWORK = {
     ],
     'DEFAULT_PAGINATION_CLASS': 'rest_framework.pagination.PageNumberPagination',
     'PAGE_SIZE': 10,
+    # Sliding-window limits applied by accounts.throttling, per user or IP
+    'DEFAULT_THROTTLE_RATES': {
+        'likes': os.getenv('THROTTLE_LIKES', '120/min'),
+        'follows': os.getenv('THROTTLE_FOLLOWS', '60/min'),
+        'comments': os.getenv('THROTTLE_COMMENTS', '30/min'),
+        'login': os.getenv('THROTTLE_LOGIN', '10/min'),
+        'register': os.getenv('THROTTLE_REGISTER', '5/hour'),
+        'password_reset': os.getenv('THROTTLE_PASSWORD_RESET', '5/hour'),
+    },
 }
 
 # CORS Settings
@@ -242,9 +357,18 @@ SOCIALACCOUNT_PROVIDERS = {
 }
 
 # Email Settings (for password reset)
-EMAIL_BACKEND = 'django.core.mail.backends.console.EmailBackend'  # For development
+EMAIL_BACKEND = os.getenv('EMAIL_BACKEND', 'django.core.mail.backends.console.EmailBackend')  # For development
+EMAIL_FILE_PATH = os.getenv('EMAIL_FILE_PATH', BASE_DIR / 'sent_emails')  # Used by the filebased backend
 DEFAULT_FROM_EMAIL = 'noreply@instagram-clone.com'
 
+# Background sender pool for outbound email (see accounts/mail.py)
+MAIL_QUEUE = {
+    'WORKERS': 2,
+    'MAX_RETRIES': 3,
+    'BACKOFF': 2.0,      # Seconds before the first retry, doubled each attempt
+    'MAX_QUEUED': 1000,
+}
+
 # For production, use:
 # EMAIL_BACKEND = 'django.core.mail.backends.smtp.EmailBackend'
 # EMAIL_HOST = 'smtp.gmail.com'
@@ -254,5 +378,14 @@ DEFAULT_FROM_EMAIL = 'noreply@instagram-clone.com'
 # EMAIL_HOST_PASSWORD = 'your-app-password'
 # DEFAULT_FROM_EMAIL = 'your-email@gmail.com'
 
+# Notification retention (see accounts/maintenance.py and `manage.py prune_notifications`)
+NOTIFICATION_RETENTION = {
+    'READ_DAYS': 90,
+    'COMPACT_AFTER_DAYS': 7,
+    'BATCH_SIZE': 500,
+    'BATCH_PAUSE': 0.05,
+    'PEAK_HOURS': (17, 23),
+}
+
 # Frontend URL (for password reset links)
 FRONTEND_URL = 'http://localhost:8000'